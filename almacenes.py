@@ -0,0 +1,254 @@
+"""
+Inventario repartido en varios almacenes, cada uno con su propia base de datos.
+
+Cada almacén es un archivo SQLite independiente (con el esquema completo de
+database_manager), así que las escrituras de almacenes distintos no compiten por el mismo
+bloqueo y ningún archivo carga con todo el inventario. Los IDs de producto llevan el
+número de almacén en sus bits altos (id = almacen << BITS_ALMACEN | secuencia local):
+cualquier ID dice en qué base está, sin tablas de ruteo, y los IDs del almacén 0 son los
+mismos que los de una base única, de modo que un 'inventario.db' existente puede ser el
+almacén 0 sin cambios.
+
+Las escrituras van directo a la base de su almacén y se rechazan hasta que preparar()
+termine bien: antes, cada almacén numeraría sus productos desde 1. Las búsquedas, reportes y listados
+se ejecutan en todos los almacenes a la vez en un pool de hilos (sqlite3 libera el GIL
+mientras ejecuta cada consulta, y cada base tiene su propio pool de conexiones) y los
+resultados se combinan a medida que llegan: los listados piden la página siguiente de
+cada almacén mientras se consume la actual y se mezclan por ID con heapq.merge.
+
+Uso:
+    import almacenes
+    inv = almacenes.Almacenes(['central.db', 'norte.db', 'sur.db'])
+    inv.preparar()
+    id_mouse = inv.registrar_producto(1, 'Mouse', '', 5, 9.9, 'Periféricos')
+    inv.buscar_producto('texto', 'mouse', limite=20)
+    for producto in inv.iterar_reorden():
+        ...
+    inv.cerrar()
+"""
+import heapq
+import operator
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, zip_longest
+
+import database_manager as db
+
+# Bits de la secuencia local de cada almacén: hasta 2**40 productos por almacén
+BITS_ALMACEN = 40
+MAX_ALMACENES = 1 << (63 - BITS_ALMACEN)
+
+_POR_ID = operator.itemgetter('id')
+_POR_CANTIDAD = operator.itemgetter('cantidad')
+_SIN_VALOR = object()
+
+
+def primer_id(almacen):
+    """Menor ID de producto que puede asignar el almacén (0 para el almacén 0)."""
+    return almacen << BITS_ALMACEN
+
+def almacen_de(id_producto):
+    """Número de almacén al que pertenece un ID de producto."""
+    return int(id_producto) >> BITS_ALMACEN
+
+def _en_base(ruta, funcion, *args):
+    with db.usar_base(ruta):
+        return funcion(*args)
+
+
+class Almacenes:
+    """
+    Conjunto de almacenes: 'rutas[n]' es la base de datos del almacén n. Replica la API
+    de database_manager (registrar, actualizar, eliminar, buscar, reportes, listados)
+    ruteando cada escritura a su almacén y repartiendo las lecturas entre todos.
+    Puede usarse desde varios hilos a la vez.
+    """
+
+    def __init__(self, rutas, max_hilos=None):
+        if not rutas:
+            raise ValueError("Se necesita al menos un almacén.")
+        if len(rutas) > MAX_ALMACENES:
+            raise ValueError(f"Como máximo {MAX_ALMACENES} almacenes.")
+        self.rutas = list(rutas)
+        # Un hilo por almacén: cada consulta repartida ocupa uno solo por almacén
+        self._pool = ThreadPoolExecutor(max_workers=max_hilos or len(self.rutas),
+                                        thread_name_prefix='almacen')
+        # Sin preparar, cada almacén numera desde 1 y almacen_de() mandaría todo al almacén 0
+        self.preparado = False
+
+    def __len__(self):
+        return len(self.rutas)
+
+    def cerrar(self):
+        """Detiene el pool de hilos. Las conexiones se cierran con db.cerrar_conexiones()."""
+        self._pool.shutdown(wait=True)
+
+    def ruta(self, almacen):
+        """Base de datos del almacén indicado."""
+        if not 0 <= almacen < len(self.rutas):
+            raise ValueError(f"Almacén inexistente: {almacen}")
+        return self.rutas[almacen]
+
+    def _en_todos(self, funcion, *args):
+        """Ejecuta funcion(*args) en cada almacén en paralelo; retorna los futuros en orden de almacén."""
+        return [self._pool.submit(_en_base, ruta, funcion, *args) for ruta in self.rutas]
+
+    def _en_almacen_de(self, id_producto, funcion, *args, fallo=False):
+        if not self._listo_para_escribir():
+            return fallo
+        return _en_base(self.ruta(almacen_de(id_producto)), funcion, id_producto, *args)
+
+    def _listo_para_escribir(self):
+        if not self.preparado:
+            print("Error: los almacenes no están preparados; ejecute preparar() antes de escribir.")
+        return self.preparado
+
+    # --- Esquema ---
+
+    def preparar(self):
+        """
+        Crea o actualiza el esquema de todos los almacenes (en paralelo) y hace que cada
+        uno asigne IDs dentro de su rango. Retorna True si todos quedaron listos; hasta
+        entonces las escrituras se rechazan.
+        """
+        self.preparado = all([futuro.result() for futuro in [
+            self._pool.submit(_en_base, ruta, self._preparar_almacen, almacen)
+            for almacen, ruta in enumerate(self.rutas)
+        ]])
+        return self.preparado
+
+    @staticmethod
+    def _preparar_almacen(almacen):
+        db.setup_database()
+        desde, hasta = primer_id(almacen), primer_id(almacen + 1)
+        try:
+            with db.transaccion() as conn:
+                minimo, maximo = conn.execute("SELECT MIN(id), MAX(id) FROM productos").fetchone()
+                if minimo is not None and (minimo < desde or maximo >= hasta):
+                    print(f"Error: la base {db.base_actual()} tiene IDs fuera del rango del almacén {almacen}.")
+                    return False
+                # AUTOINCREMENT continúa desde sqlite_sequence: se adelanta al inicio del rango
+                secuencia = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'productos'").fetchone()
+                if secuencia is None:
+                    conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('productos', ?)", (desde,))
+                elif secuencia[0] < desde:
+                    conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'productos'", (desde,))
+            return True
+        except sqlite3.Error as e:
+            print(f"Error de BD al preparar el almacén {almacen}: {e}")
+            return False
+
+    # --- Escrituras (van a la base de un solo almacén) ---
+
+    def registrar_producto(self, almacen, nombre, descripcion, cantidad, precio, categoria, punto_reorden=None):
+        """
+        Registra un producto en el almacén indicado. Retorna su ID (que ya indica el
+        almacén), o None si no se registró.
+        """
+        ruta = self.ruta(almacen)
+        if not self._listo_para_escribir():
+            return None
+        return _en_base(ruta, self._registrar_en_almacen,
+                        nombre, descripcion, cantidad, precio, categoria, punto_reorden)
+
+    @staticmethod
+    def _registrar_en_almacen(*datos):
+        try:
+            with db.transaccion() as conn:
+                if not db.registrar_producto(*datos):
+                    return None
+                # Misma conexión y transacción que el INSERT: es el ID recién asignado
+                return conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error de BD al registrar: {e}")
+            return None
+
+    def actualizar_producto(self, id_producto, nombre, descripcion, cantidad, precio, categoria, punto_reorden=None):
+        """Actualiza un producto en el almacén al que pertenece su ID."""
+        return self._en_almacen_de(id_producto, db.actualizar_producto,
+                                   nombre, descripcion, cantidad, precio, categoria, punto_reorden)
+
+    def eliminar_producto(self, id_producto):
+        return self._en_almacen_de(id_producto, db.eliminar_producto)
+
+    def definir_punto_reorden(self, id_producto, punto_reorden):
+        return self._en_almacen_de(id_producto, db.definir_punto_reorden, punto_reorden)
+
+    def registrar_movimiento(self, id_producto, delta, motivo=None, referencia=None):
+        return self._en_almacen_de(id_producto, db.registrar_movimiento, delta, motivo, referencia, fallo=None)
+
+    # --- Lecturas repartidas entre todos los almacenes ---
+
+    def buscar_producto(self, criterio, valor, limite=None):
+        """
+        Busca en todos los almacenes a la vez (por ID, solo en el almacén del ID).
+        Los resultados se intercalan: el primero de cada almacén, luego el segundo, etc.;
+        así se respeta la relevancia dentro de cada almacén y un 'limite' reparte los
+        resultados entre todos en lugar de llenarse con los del primero.
+        """
+        if criterio == 'id':
+            try:
+                almacen = almacen_de(valor)
+            except (TypeError, ValueError):
+                return []
+            if not 0 <= almacen < len(self.rutas):
+                return []
+            return _en_base(self.rutas[almacen], db.buscar_producto, criterio, valor, limite)
+
+        resultados = [futuro.result() for futuro in self._en_todos(db.buscar_producto, criterio, valor, limite)]
+        intercalados = [p for p in chain.from_iterable(zip_longest(*resultados, fillvalue=_SIN_VALOR))
+                        if p is not _SIN_VALOR]
+        return intercalados if limite is None else intercalados[:limite]
+
+    def reporte_bajo_stock(self, limite):
+        """Productos con cantidad <= 'limite' en todos los almacenes, ordenados por cantidad."""
+        resultados = [futuro.result() for futuro in self._en_todos(db.reporte_bajo_stock, limite)]
+        return list(heapq.merge(*resultados, key=_POR_CANTIDAD))
+
+    def reporte_categorias(self):
+        """Resumen por categoría de todos los almacenes (suma de los agregados de cada uno)."""
+        totales = {}
+        for futuro in self._en_todos(db.reporte_categorias):
+            for fila in futuro.result():
+                total = totales.setdefault(fila['categoria'], {
+                    'categoria': fila['categoria'], 'productos': 0, 'unidades': 0,
+                    'valor_total': 0.0, 'bajo_stock': 0,
+                })
+                total['productos'] += fila['productos']
+                total['unidades'] += fila['unidades']
+                total['valor_total'] += fila['valor_total']
+                total['bajo_stock'] += fila['bajo_stock']
+        resultado = sorted(totales.values(), key=operator.itemgetter('valor_total'), reverse=True)
+        for total in resultado:
+            total['valor_total'] = round(total['valor_total'], 2)
+        return resultado
+
+    def iterar_productos(self, tamano_pagina=db.TAMANO_PAGINA_ITERACION):
+        """Genera los productos de todos los almacenes ordenados por ID, de a 'tamano_pagina' por almacén."""
+        return self._mezclar(db.obtener_pagina, tamano_pagina)
+
+    def iterar_reorden(self, tamano_pagina=db.TAMANO_PAGINA_ITERACION):
+        """Genera los productos por reponer de todos los almacenes ordenados por ID."""
+        return self._mezclar(db.reporte_reorden, tamano_pagina)
+
+    def _mezclar(self, leer_pagina, tamano_pagina):
+        # Las primeras páginas de todos los almacenes se piden antes de empezar a entregar filas
+        flujos = [
+            self._paginas(ruta, leer_pagina, tamano_pagina,
+                          self._pool.submit(_en_base, ruta, leer_pagina, 0, tamano_pagina))
+            for ruta in self.rutas
+        ]
+        return heapq.merge(*flujos, key=_POR_ID)
+
+    def _paginas(self, ruta, leer_pagina, tamano_pagina, pedido):
+        """
+        Filas de un almacén, página por página según 'leer_pagina(despues_de_id, limite)'.
+        Mientras se entrega una página, la siguiente ya se está leyendo en el pool.
+        """
+        while True:
+            pagina = pedido.result()
+            if len(pagina) == tamano_pagina:
+                pedido = self._pool.submit(_en_base, ruta, leer_pagina, pagina[-1]['id'], tamano_pagina)
+            yield from pagina
+            if len(pagina) < tamano_pagina:
+                return
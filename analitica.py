@@ -0,0 +1,307 @@
+"""
+Instantánea analítica del inventario en memoria.
+
+Guarda 'productos' por columnas: los numéricos en arreglos tipados (array) y la categoría
+codificada por diccionario (un entero por fila y la lista de valores distintos). Así cada
+producto ocupa unas decenas de bytes en lugar de un sqlite3.Row, y filtros, ordenamientos
+y agregados recorren arreglos contiguos con map/compress/sum, que corren en C, en lugar
+de consultar y recorrer filas una por una.
+
+La instantánea se refresca de forma incremental con la columna de seguimiento de cambios
+('productos.version') y las lápidas de 'productos_eliminados' (migración 7): cada refresco
+trae solo lo que cambió desde el anterior.
+
+Uso:
+    import analitica
+    inv = analitica.Instantanea.cargar()
+    caros = inv.filtrar(precio_min=100, categoria='Oficina')
+    inv.filas(inv.top(10, por='valor', seleccion=caros))
+    inv.agregar_por_categoria()
+    inv.refrescar()      # tras nuevas escrituras
+"""
+import heapq
+import operator
+import sqlite3
+from array import array
+from bisect import bisect_left
+from functools import partial
+from itertools import compress
+
+import database_manager as db
+
+# Filas por cada fetchmany al cargar o refrescar
+TAMANO_BLOQUE = 10000
+
+# Columnas numéricas y su código de array
+COLUMNAS_NUMERICAS = {'id': 'q', 'cantidad': 'q', 'precio': 'd', 'punto_reorden': 'q'}
+# Criterios de orden y de top-N (además de las columnas numéricas)
+CRITERIOS_ORDEN = ('id', 'cantidad', 'precio', 'punto_reorden', 'valor', 'nombre', 'categoria')
+
+# Orden de las columnas leídas de la base (debe coincidir con _agregar_bloque y _actualizar_bloque)
+_COLUMNAS_LECTURA = 'id, nombre, cantidad, precio, categoria, punto_reorden'
+
+
+def _columnas_tipadas(filas):
+    """
+    Convierte filas (en el orden de _COLUMNAS_LECTURA) en columnas con el tipo de la
+    instantánea. Lanza TypeError u OverflowError si algún valor no entra (un REAL o NULL
+    en una columna entera, un NULL en el precio): SQLite no impone los tipos declarados.
+    """
+    ids, nombres, cantidades, precios, categorias, puntos = zip(*filas)
+    return (array('q', ids), nombres, array('q', cantidades), array('d', precios), categorias,
+            array('q', puntos))
+
+
+class Instantanea:
+    """
+    Copia columnar de 'productos'. Las filas no tienen un orden particular: las
+    operaciones trabajan con posiciones (índices en los arreglos) y filas() las
+    convierte en diccionarios. Una selección es un array('q') de posiciones; None
+    equivale a todas las filas. No es segura para modificarse desde varios hilos a la vez.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.id = array('q')
+        self.cantidad = array('q')
+        self.precio = array('d')
+        self.punto_reorden = array('q')
+        self.nombre = []
+        self.categoria = array('i')       # Código en self.categorias (-1 = sin categoría)
+        self.categorias = []              # Código -> valor
+        self._codigos = {}                # Valor -> código
+        self._posiciones = {}             # ID de producto -> posición en los arreglos
+
+    @classmethod
+    def cargar(cls, tamano_bloque=TAMANO_BLOQUE):
+        """Lee el inventario completo. Retorna la instantánea, o None si falló la base de datos."""
+        instantanea = cls()
+        return instantanea if instantanea.refrescar(tamano_bloque) is not None else None
+
+    def __len__(self):
+        return len(self.id)
+
+    # --- Refresco incremental ---
+
+    def refrescar(self, tamano_bloque=TAMANO_BLOQUE):
+        """
+        Aplica los cambios posteriores a la última lectura (la primera vez, todo el
+        inventario). Retorna {'version', 'cambiados', 'eliminados'}, o None si falló
+        la base de datos o hay valores que no entran en las columnas tipadas (por
+        ejemplo, un precio NULL); en ese caso la instantánea queda como estaba.
+        """
+        # La carga inicial se arma en una instantánea aparte y las siguientes se leen (y
+        # validan) completas antes de aplicarse: un fallo a mitad de camino no deja nada a medias
+        nueva = type(self)() if not self._posiciones else None
+        pendientes = []
+        cambiados = 0
+        try:
+            with db.lectura_cambios(self.version, _COLUMNAS_LECTURA) as (version, productos, eliminados):
+                if version == self.version:
+                    return {'version': version, 'cambiados': 0, 'eliminados': 0}
+                while True:
+                    filas = productos.fetchmany(tamano_bloque)
+                    if not filas:
+                        break
+                    if nueva is not None:
+                        # Carga inicial: se agregan columnas enteras
+                        nueva._agregar_bloque(filas)
+                    else:
+                        _columnas_tipadas(filas)
+                        pendientes.append(filas)
+                    cambiados += len(filas)
+        except sqlite3.Error as e:
+            print(f"Error de BD al refrescar la instantánea: {e}")
+            return None
+        except (TypeError, OverflowError) as e:
+            print(f"Error: 'productos' tiene valores que la instantánea no puede guardar ({e}).")
+            return None
+        if nueva is not None:
+            self.__dict__.update(nueva.__dict__)
+        for filas in pendientes:
+            self._actualizar_bloque(filas)
+        for id_producto in eliminados:
+            self._quitar(id_producto)
+        self.version = version
+        return {'version': version, 'cambiados': cambiados, 'eliminados': len(eliminados)}
+
+    def _codigo_categoria(self, categoria):
+        if categoria is None:
+            return -1
+        codigo = self._codigos.get(categoria)
+        if codigo is None:
+            codigo = self._codigos[categoria] = len(self.categorias)
+            self.categorias.append(categoria)
+        return codigo
+
+    def _agregar_bloque(self, filas):
+        """Agrega filas nuevas (ninguna presente en la instantánea) columna por columna."""
+        # Se convierte todo el bloque antes de tocar cualquier columna
+        ids, nombres, cantidades, precios, categorias, puntos = _columnas_tipadas(filas)
+        self._posiciones.update(zip(ids, range(len(self.id), len(self.id) + len(ids))))
+        self.id.extend(ids)
+        self.nombre.extend(nombres)
+        self.cantidad.extend(cantidades)
+        self.precio.extend(precios)
+        self.categoria.extend(map(self._codigo_categoria, categorias))
+        self.punto_reorden.extend(puntos)
+
+    def _actualizar_bloque(self, filas):
+        for id_producto, nombre, cantidad, precio, categoria, punto_reorden in filas:
+            posicion = self._posiciones.get(id_producto)
+            if posicion is None:
+                self._agregar_bloque([(id_producto, nombre, cantidad, precio, categoria, punto_reorden)])
+                continue
+            self.nombre[posicion] = nombre
+            self.cantidad[posicion] = cantidad
+            self.precio[posicion] = precio
+            self.categoria[posicion] = self._codigo_categoria(categoria)
+            self.punto_reorden[posicion] = punto_reorden
+
+    def _quitar(self, id_producto):
+        """Quita una fila moviendo la última a su lugar: O(1) y los arreglos siguen compactos."""
+        posicion = self._posiciones.pop(id_producto, None)
+        if posicion is None:
+            return
+        ultima = len(self.id) - 1
+        for columna in (self.id, self.cantidad, self.precio, self.punto_reorden, self.nombre, self.categoria):
+            columna[posicion] = columna[ultima]
+            columna.pop()
+        if posicion != ultima:
+            self._posiciones[self.id[posicion]] = posicion
+
+    # --- Consultas ---
+
+    def filtrar(self, categoria=None, precio_min=None, precio_max=None, stock_min=None,
+                stock_max=None, bajo_reorden=False, seleccion=None):
+        """
+        Retorna las posiciones que cumplen todos los filtros indicados (dentro de
+        'seleccion', si se indica). Los rangos son inclusivos.
+        """
+        # (columnas, prueba): primero los filtros que suelen ser más selectivos
+        filtros = []
+        if categoria is not None:
+            codigo = self._codigos.get(categoria)
+            if codigo is None:
+                return array('q')
+            filtros.append(((self.categoria,), codigo.__eq__))
+        if bajo_reorden:
+            filtros.append(((self.cantidad, self.punto_reorden), operator.le))
+        # Los límites se convierten al tipo de la columna para comparar con su método nativo
+        if precio_min is not None:
+            filtros.append(((self.precio,), float(precio_min).__le__))
+        if precio_max is not None:
+            filtros.append(((self.precio,), float(precio_max).__ge__))
+        if stock_min is not None:
+            filtros.append(((self.cantidad,), int(stock_min).__le__))
+        if stock_max is not None:
+            filtros.append(((self.cantidad,), int(stock_max).__ge__))
+
+        posiciones = seleccion
+        for columnas, prueba in filtros:
+            # Cada filtro recorre solo las posiciones que sobrevivieron a los anteriores
+            if posiciones is None:
+                posiciones = compress(range(len(self.id)), map(prueba, *columnas))
+            else:
+                posiciones = compress(posiciones, map(prueba, *(map(c.__getitem__, posiciones) for c in columnas)))
+            posiciones = array('q', posiciones)
+        return posiciones if posiciones is not None else array('q', range(len(self.id)))
+
+    def valores(self, criterio):
+        """Retorna la columna 'criterio' completa; 'valor' es cantidad * precio."""
+        if criterio == 'valor':
+            return array('d', map(operator.mul, self.cantidad, self.precio))
+        if criterio == 'categoria':
+            return [self.categorias[c] if c >= 0 else '' for c in self.categoria]
+        if criterio not in CRITERIOS_ORDEN:
+            raise ValueError(f"Criterio no soportado: {criterio}")
+        return getattr(self, criterio)
+
+    def ordenar(self, por='id', descendente=False, seleccion=None):
+        """Retorna las posiciones (de 'seleccion' o todas) ordenadas por el criterio indicado."""
+        valores = self.valores(por)
+        posiciones = range(len(self.id)) if seleccion is None else seleccion
+        return array('q', sorted(posiciones, key=valores.__getitem__, reverse=descendente))
+
+    def top(self, n, por='valor', seleccion=None):
+        """Retorna las posiciones de los 'n' productos con mayor valor del criterio, sin ordenar todo."""
+        valores = self.valores(por)
+        posiciones = range(len(self.id)) if seleccion is None else seleccion
+        return array('q', heapq.nlargest(n, posiciones, key=valores.__getitem__))
+
+    def resumen(self, columna='precio', seleccion=None):
+        """Retorna cantidad, mínimo, máximo, suma y promedio de una columna numérica (o 'valor')."""
+        if columna not in COLUMNAS_NUMERICAS and columna != 'valor':
+            raise ValueError(f"La columna debe ser numérica: {columna}")
+        valores = self.valores(columna)
+        if seleccion is not None:
+            valores = array(valores.typecode, map(valores.__getitem__, seleccion))
+        if not valores:
+            return {'cantidad': 0, 'minimo': None, 'maximo': None, 'suma': 0, 'promedio': None}
+        suma = sum(valores)
+        return {
+            'cantidad': len(valores),
+            'minimo': min(valores),
+            'maximo': max(valores),
+            'suma': suma,
+            'promedio': suma / len(valores),
+        }
+
+    def histograma(self, limites, columna='cantidad', seleccion=None):
+        """
+        Cuenta cuántos valores caen en cada intervalo definido por 'limites' (ordenados):
+        (-inf, l0], (l0, l1], ..., (ln, +inf). Retorna una lista de len(limites) + 1 conteos.
+        """
+        valores = self.valores(columna)
+        if seleccion is not None:
+            valores = map(valores.__getitem__, seleccion)
+        conteos = [0] * (len(limites) + 1)
+        for cubeta in map(partial(bisect_left, limites), valores):
+            conteos[cubeta] += 1
+        return conteos
+
+    def agregar_por_categoria(self, seleccion=None):
+        """
+        Retorna, por categoría, productos, unidades y valor total (cantidad * precio),
+        ordenado por valor descendente. Equivale al reporte de categorías, pero sobre
+        cualquier selección: como allí, los productos sin categoría (NULL) y los de
+        categoría '' se informan juntos, bajo ''.
+        """
+        n = len(self.categorias) + 1              # La última cubeta es "sin categoría" (-1)
+        productos, unidades, valor = [0] * n, [0] * n, [0.0] * n
+        if seleccion is None:
+            filas = zip(self.categoria, self.cantidad, self.precio)
+        else:
+            filas = zip(map(self.categoria.__getitem__, seleccion),
+                        map(self.cantidad.__getitem__, seleccion),
+                        map(self.precio.__getitem__, seleccion))
+        for codigo, cantidad, precio in filas:
+            productos[codigo] += 1
+            unidades[codigo] += cantidad
+            valor[codigo] += cantidad * precio
+        nombres = self.categorias + ['']
+        totales = {}
+        for c in range(n):
+            if not productos[c]:
+                continue
+            total = totales.setdefault(nombres[c], {'categoria': nombres[c], 'productos': 0, 'unidades': 0,
+                                                   'valor_total': 0.0})
+            total['productos'] += productos[c]
+            total['unidades'] += unidades[c]
+            total['valor_total'] += valor[c]
+        resultado = sorted(totales.values(), key=operator.itemgetter('valor_total'), reverse=True)
+        for total in resultado:
+            total['valor_total'] = round(total['valor_total'], 2)
+        return resultado
+
+    def filas(self, seleccion):
+        """Convierte posiciones en diccionarios con las columnas de la instantánea (para mostrar)."""
+        return [
+            {
+                'id': self.id[p], 'nombre': self.nombre[p],
+                'categoria': self.categorias[self.categoria[p]] if self.categoria[p] >= 0 else None,
+                'cantidad': self.cantidad[p], 'precio': self.precio[p],
+                'punto_reorden': self.punto_reorden[p],
+            }
+            for p in seleccion
+        ]
@@ -0,0 +1,256 @@
+"""
+Banco de pruebas reproducible para database_manager.
+
+Genera catálogos sintéticos deterministas (misma semilla = mismos datos), los carga en
+una base de datos temporal y mide cada operación pública: latencias p50/p95/p99,
+rendimiento y pico de memoria. Los resultados se guardan en JSON para comparar corridas.
+
+Uso:
+    python benchmark.py                                  # 10k, 100k y 1M productos
+    python benchmark.py --tamanos 10000 --salida base.json
+    python benchmark.py --tamanos 10000 --comparar base.json --tolerancia 0.25
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import database_manager as db
+
+TAMANOS_POR_DEFECTO = [10_000, 100_000, 1_000_000]
+SEMILLA_POR_DEFECTO = 42
+REPETICIONES_POR_DEFECTO = 200
+
+# Vocabulario fijo para que los catálogos y las búsquedas sean reproducibles
+TIPOS = ['Laptop', 'Mouse', 'Teclado', 'Monitor', 'Cable', 'Silla', 'Escritorio', 'Lámpara',
+         'Auricular', 'Parlante', 'Cámara', 'Impresora', 'Router', 'Disco', 'Memoria', 'Batería']
+MARCAS = ['Acme', 'Zeta', 'Orion', 'Nova', 'Delta', 'Atlas', 'Vega', 'Polar', 'Sigma', 'Lumen']
+ADJETIVOS = ['compacto', 'inalámbrico', 'profesional', 'económico', 'reforzado', 'ergonómico',
+             'portátil', 'industrial', 'silencioso', 'modular']
+CATEGORIAS = ['Electrónica', 'Oficina', 'Hogar', 'Redes', 'Almacenamiento', 'Periféricos',
+              'Audio', 'Fotografía', 'Mobiliario', 'Iluminación']
+
+
+# --- Generador de Catálogos Sintéticos ---
+
+def generar_catalogo(cantidad, semilla=SEMILLA_POR_DEFECTO):
+    """Genera 'cantidad' tuplas (nombre, descripcion, cantidad, precio, categoria) deterministas."""
+    rng = random.Random(semilla)
+    for i in range(cantidad):
+        tipo = rng.choice(TIPOS)
+        marca = rng.choice(MARCAS)
+        nombre = f"{tipo} {marca} {rng.randint(100, 9999)}"
+        descripcion = f"{tipo} {rng.choice(ADJETIVOS)} modelo {i}"
+        # Distribución sesgada: muchos productos con poco stock, pocos con mucho
+        stock = int(rng.expovariate(1 / 60))
+        precio = round(rng.uniform(1, 2500), 2)
+        yield nombre, descripcion, stock, precio, rng.choice(CATEGORIAS)
+
+def _escribir_csv(ruta, catalogo):
+    with open(ruta, 'w', newline='', encoding='utf-8') as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(['nombre', 'descripcion', 'cantidad', 'precio', 'categoria'])
+        escritor.writerows(catalogo)
+
+
+# --- Medición ---
+
+def _percentil(valores_ordenados, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, min(len(valores_ordenados) - 1, round(p / 100 * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
+
+def _medir(operacion, argumentos, filas_por_llamada=None):
+    """
+    Ejecuta 'operacion' con cada tupla de 'argumentos' y resume las latencias.
+    La última tupla se reserva para medir el pico de memoria con tracemalloc en una
+    ejecución aparte, para que el rastreo de memoria no distorsione los tiempos.
+    """
+    latencias = []
+    filas = 0
+    for args in argumentos[:-1]:
+        inicio = time.perf_counter()
+        resultado = operacion(*args)
+        latencias.append(time.perf_counter() - inicio)
+        if filas_por_llamada is not None:
+            filas += filas_por_llamada(resultado)
+
+    tracemalloc.start()
+    try:
+        filas_extra = operacion(*argumentos[-1])
+        if filas_por_llamada is not None:
+            filas_por_llamada(filas_extra)
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    total = sum(latencias)
+    latencias.sort()
+    metricas = {
+        'llamadas': len(latencias),
+        'p50_ms': _percentil(latencias, 50) * 1000,
+        'p95_ms': _percentil(latencias, 95) * 1000,
+        'p99_ms': _percentil(latencias, 99) * 1000,
+        'max_ms': latencias[-1] * 1000,
+        'operaciones_por_segundo': len(latencias) / total if total > 0 else 0.0,
+        'pico_memoria_kib': pico / 1024,
+    }
+    if filas_por_llamada is not None:
+        metricas['filas_por_segundo'] = filas / total if total > 0 else 0.0
+    return metricas
+
+def _recorrer_inventario():
+    """Recorre todo el inventario en streaming y retorna cuántas filas leyó."""
+    return sum(1 for _ in db.iterar_productos())
+
+def ejecutar_benchmark(tamano, semilla, repeticiones, directorio):
+    """Carga un catálogo de 'tamano' productos en una BD temporal y mide cada operación."""
+    ruta_bd = os.path.join(directorio, f'benchmark_{tamano}.db')
+    ruta_csv = os.path.join(directorio, f'catalogo_{tamano}.csv')
+    for ruta in (ruta_bd, ruta_bd + '-wal', ruta_bd + '-shm'):
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+    db_original = db.DB_NAME
+    db.DB_NAME = ruta_bd
+    # Se mide el acceso a disco, no la caché en memoria
+    db.desactivar_cache()
+    rng = random.Random(semilla + tamano)
+    resultados = {}
+    try:
+        db.setup_database()
+        _escribir_csv(ruta_csv, generar_catalogo(tamano, semilla))
+        carga = db.importar_productos(ruta_csv)
+        os.remove(ruta_csv)
+        resultados['carga_masiva'] = {
+            'filas': carga['insertados'],
+            'segundos': carga['segundos'],
+            'filas_por_segundo': carga['filas_por_segundo'],
+        }
+
+        ids = lambda n: [(rng.randint(1, tamano),) for _ in range(n)]
+        # Cada operación recibe repeticiones + 1 argumentos: el último es para medir memoria
+        n = repeticiones + 1
+        nuevos = list(generar_catalogo(n, semilla + 1))
+        # Al recorrer todo el inventario se toman pocas muestras: cada una lee la tabla completa
+        recorridos = max(1, min(5, 1_000_000 // tamano))
+
+        resultados['registrar_producto'] = _medir(db.registrar_producto, nuevos)
+        resultados['visualizar (recorrido completo)'] = _medir(
+            _recorrer_inventario, [()] * (recorridos + 1), filas_por_llamada=lambda n: n)
+        resultados['obtener_pagina'] = _medir(
+            db.obtener_pagina, [(i, db.TAMANO_PAGINA) for (i,) in ids(n)], filas_por_llamada=len)
+        resultados['buscar_producto (id)'] = _medir(
+            db.buscar_producto, [('id', i) for (i,) in ids(n)], filas_por_llamada=len)
+        resultados['buscar_producto (nombre)'] = _medir(
+            db.buscar_producto, [('nombre', f"{rng.choice(TIPOS)} {rng.choice(MARCAS)}", 50)
+                                 for _ in range(n)], filas_por_llamada=len)
+        resultados['buscar_producto (categoria)'] = _medir(
+            db.buscar_producto, [('categoria', rng.choice(CATEGORIAS)[:4], 50)
+                                 for _ in range(n)], filas_por_llamada=len)
+        resultados['reporte_bajo_stock'] = _medir(
+            db.reporte_bajo_stock, [(rng.randint(0, 3),) for _ in range(max(2, n // 10))],
+            filas_por_llamada=len)
+        resultados['actualizar_producto'] = _medir(
+            db.actualizar_producto, [(i,) + nuevos[k] for k, (i,) in enumerate(ids(n))])
+        # IDs distintos: borrar dos veces el mismo no mediría un borrado real
+        borrar = rng.sample(range(1, tamano + 1), min(n, tamano))
+        resultados['eliminar_producto'] = _medir(db.eliminar_producto, [(i,) for i in borrar])
+    finally:
+        db.cerrar_conexiones()
+        db.DB_NAME = db_original
+        for ruta in (ruta_bd, ruta_bd + '-wal', ruta_bd + '-shm'):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+    return resultados
+
+
+# --- Comparación entre Corridas ---
+
+def comparar(actual, base, tolerancia):
+    """
+    Compara el p95 de cada operación con una corrida anterior.
+    Retorna la lista de regresiones (operaciones más lentas que base * (1 + tolerancia)).
+    """
+    regresiones = []
+    for tamano, operaciones in actual['resultados'].items():
+        for nombre, metricas in operaciones.items():
+            anterior = base.get('resultados', {}).get(tamano, {}).get(nombre)
+            if not anterior or 'p95_ms' not in metricas or 'p95_ms' not in anterior:
+                continue
+            if anterior['p95_ms'] > 0 and metricas['p95_ms'] > anterior['p95_ms'] * (1 + tolerancia):
+                regresiones.append({
+                    'tamano': tamano, 'operacion': nombre,
+                    'p95_base_ms': anterior['p95_ms'], 'p95_actual_ms': metricas['p95_ms'],
+                })
+    return regresiones
+
+def _imprimir_resumen(tamano, resultados):
+    print(f"\n=== {tamano:,} productos ===")
+    carga = resultados['carga_masiva']
+    print(f"{'carga_masiva':<34} {carga['segundos']:>9.2f} s   {carga['filas_por_segundo']:>12,.0f} filas/s")
+    print(f"{'operación':<34} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10} {'pico KiB':>10}")
+    for nombre, m in resultados.items():
+        if nombre == 'carga_masiva':
+            continue
+        print(f"{nombre:<34} {m['p50_ms']:>9.3f} {m['p95_ms']:>9.3f} {m['p99_ms']:>9.3f} "
+              f"{m['operaciones_por_segundo']:>10,.0f} {m['pico_memoria_kib']:>10,.0f}")
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Benchmark reproducible de database_manager")
+    parser.add_argument('--tamanos', type=int, nargs='+', default=TAMANOS_POR_DEFECTO)
+    parser.add_argument('--semilla', type=int, default=SEMILLA_POR_DEFECTO)
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES_POR_DEFECTO,
+                        help="Llamadas medidas por operación")
+    parser.add_argument('--salida', default='benchmark.json', help="Archivo JSON de resultados")
+    parser.add_argument('--directorio', default=None, help="Directorio para las BD temporales")
+    parser.add_argument('--comparar', help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument('--tolerancia', type=float, default=0.20,
+                        help="Aumento de p95 permitido antes de marcar una regresión (0.20 = 20%%)")
+    args = parser.parse_args(argumentos)
+
+    informe = {
+        'meta': {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'plataforma': platform.platform(),
+            'semilla': args.semilla,
+            'repeticiones': args.repeticiones,
+        },
+        'resultados': {},
+    }
+    with tempfile.TemporaryDirectory(dir=args.directorio) as directorio:
+        for tamano in args.tamanos:
+            resultados = ejecutar_benchmark(tamano, args.semilla, args.repeticiones, directorio)
+            informe['resultados'][str(tamano)] = resultados
+            _imprimir_resumen(tamano, resultados)
+
+    with open(args.salida, 'w', encoding='utf-8') as archivo:
+        json.dump(informe, archivo, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            regresiones = comparar(informe, json.load(archivo), args.tolerancia)
+        for r in regresiones:
+            print(f"REGRESIÓN [{r['tamano']}] {r['operacion']}: "
+                  f"p95 {r['p95_base_ms']:.3f} ms -> {r['p95_actual_ms']:.3f} ms")
+        if regresiones:
+            return 1
+        print("Sin regresiones respecto de la corrida base.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
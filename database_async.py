@@ -0,0 +1,181 @@
+"""
+API asyncio para database_manager.
+
+Cada función bloqueante de database_manager tiene aquí su versión 'async'. Las lecturas
+se ejecutan en un pool de hilos dedicado, cada hilo con su propia conexión (en modo WAL
+los lectores no se bloquean entre sí) a la base del llamador (DB_NAME, o la fijada con
+db.usar_base() en la tarea que hace la llamada); las escrituras pasan por un único hilo escritor,
+así que nunca compiten por el bloqueo de escritura de SQLite. De este modo cientos de
+corrutinas pueden compartir el mismo archivo sin detener el event loop.
+
+Uso:
+    import database_async as adb
+
+    productos = await adb.buscar_producto('nombre', 'lap')
+    async for producto in adb.iterar_productos():
+        ...
+    await adb.cerrar()
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import database_manager as db
+
+# Hilos (y conexiones) dedicados a lecturas concurrentes
+HILOS_LECTURA = 8
+
+_lectores = None
+_escritor = None
+_lock = threading.Lock()
+# Conexiones fijadas a los hilos de trabajo, para cerrarlas al apagar los pools
+_conexiones = []
+# Bases para las que cada hilo de trabajo ya tiene su conexión fijada
+_hilo = threading.local()
+
+def _en_base(ruta, funcion):
+    """
+    Ejecuta 'funcion' en el hilo de trabajo sobre la base del llamador (db.usar_base()),
+    fijándole a este hilo una conexión propia para esa base la primera vez.
+    """
+    fijadas = getattr(_hilo, 'rutas', None)
+    if fijadas is None:
+        fijadas = _hilo.rutas = set()
+    if ruta not in fijadas:
+        conn = db.fijar_conexion_hilo(ruta)
+        fijadas.add(ruta)
+        with _lock:
+            _conexiones.append(conn)
+    with db.usar_base(ruta):
+        return funcion()
+
+def _ejecutores():
+    global _lectores, _escritor
+    with _lock:
+        if _lectores is None:
+            _lectores = ThreadPoolExecutor(HILOS_LECTURA, 'bd-lector')
+            # Un solo hilo: las escrituras se serializan sin esperar el bloqueo de SQLite
+            _escritor = ThreadPoolExecutor(1, 'bd-escritor')
+        return _lectores, _escritor
+
+async def _leer(funcion, *args, **kwargs):
+    lectores, _ = _ejecutores()
+    return await asyncio.get_running_loop().run_in_executor(
+        lectores, _en_base, db.base_actual(), partial(funcion, *args, **kwargs)
+    )
+
+async def _escribir(funcion, *args, **kwargs):
+    _, escritor = _ejecutores()
+    return await asyncio.get_running_loop().run_in_executor(
+        escritor, _en_base, db.base_actual(), partial(funcion, *args, **kwargs)
+    )
+
+async def cerrar():
+    """Espera las operaciones pendientes, detiene los hilos y cierra sus conexiones."""
+    global _lectores, _escritor
+    with _lock:
+        lectores, escritor = _lectores, _escritor
+        _lectores = _escritor = None
+    if lectores is None:
+        return
+
+    def apagar():
+        lectores.shutdown(wait=True)
+        escritor.shutdown(wait=True)
+        with _lock:
+            conexiones = _conexiones[:]
+            _conexiones.clear()
+        for conn in conexiones:
+            conn.close()
+
+    await asyncio.get_running_loop().run_in_executor(None, apagar)
+
+
+# --- Escrituras (hilo escritor único) ---
+
+async def setup_database():
+    return await _escribir(db.setup_database)
+
+async def registrar_producto(nombre, descripcion, cantidad, precio, categoria, punto_reorden=None):
+    return await _escribir(db.registrar_producto, nombre, descripcion, cantidad, precio, categoria, punto_reorden)
+
+async def actualizar_producto(id_producto, nombre, descripcion, cantidad, precio, categoria, punto_reorden=None):
+    return await _escribir(
+        db.actualizar_producto, id_producto, nombre, descripcion, cantidad, precio, categoria, punto_reorden
+    )
+
+async def eliminar_producto(id_producto):
+    return await _escribir(db.eliminar_producto, id_producto)
+
+async def definir_punto_reorden(id_producto, punto_reorden):
+    return await _escribir(db.definir_punto_reorden, id_producto, punto_reorden)
+
+async def registrar_movimiento(id_producto, delta, motivo=None, referencia=None):
+    return await _escribir(db.registrar_movimiento, id_producto, delta, motivo, referencia)
+
+async def registrar_movimientos(movimientos, atomico=False):
+    return await _escribir(db.registrar_movimientos, movimientos, atomico)
+
+async def recalcular_resumen_categorias():
+    return await _escribir(db.recalcular_resumen_categorias)
+
+async def purgar_eventos_reorden(hasta=None, dias=None):
+    return await _escribir(db.purgar_eventos_reorden, hasta, dias)
+
+async def restaurar_respaldo(ruta_respaldo, respaldar_antes=True, directorio=None):
+    return await _escribir(db.restaurar_respaldo, ruta_respaldo, respaldar_antes, directorio)
+
+async def importar_productos(ruta, formato=None, tamano_lote=db.TAMANO_LOTE_IMPORTACION, ruta_rechazados=None):
+    return await _escribir(db.importar_productos, ruta, formato, tamano_lote, ruta_rechazados)
+
+
+# --- Lecturas (pool de hilos lectores) ---
+
+async def visualizar_productos():
+    return await _leer(db.visualizar_productos)
+
+async def obtener_pagina(despues_de_id=0, limite=db.TAMANO_PAGINA):
+    return await _leer(db.obtener_pagina, despues_de_id, limite)
+
+async def obtener_pagina_anterior(antes_de_id, limite=db.TAMANO_PAGINA):
+    return await _leer(db.obtener_pagina_anterior, antes_de_id, limite)
+
+async def buscar_producto(criterio, valor, limite=None):
+    return await _leer(db.buscar_producto, criterio, valor, limite)
+
+async def reporte_bajo_stock(limite):
+    return await _leer(db.reporte_bajo_stock, limite)
+
+async def reporte_reorden(despues_de_id=0, limite=-1):
+    return await _leer(db.reporte_reorden, despues_de_id, limite)
+
+async def cambios_bajo_stock(desde=0, limite=1000):
+    return await _leer(db.cambios_bajo_stock, desde, limite)
+
+async def reporte_categorias():
+    return await _leer(db.reporte_categorias)
+
+async def historial_movimientos(id_producto, limite=50):
+    return await _leer(db.historial_movimientos, id_producto, limite)
+
+async def listar_respaldos(directorio=None):
+    return await _leer(db.listar_respaldos, directorio)
+
+async def crear_respaldo(directorio=None, paginas_por_paso=db.PAGINAS_POR_PASO, pausa=db.PAUSA_ENTRE_PASOS,
+                         retencion=db.RETENCION_RESPALDOS, progreso=None):
+    """El respaldo copia con su propia conexión, sin ocupar al escritor; 'progreso' se llama desde un hilo lector."""
+    return await _leer(db.crear_respaldo, directorio, paginas_por_paso, pausa, retencion, progreso)
+
+async def iterar_productos(tamano_pagina=db.TAMANO_PAGINA_ITERACION, despues_de_id=0):
+    """
+    Iteración asíncrona de todo el inventario ('async for'), página por página.
+    Solo una página vive en memoria y el event loop queda libre mientras se lee la siguiente.
+    """
+    while True:
+        pagina = await _leer(db.obtener_pagina, despues_de_id, tamano_pagina)
+        for producto in pagina:
+            yield producto
+        if len(pagina) < tamano_pagina:
+            return
+        despues_de_id = pagina[-1]['id']
@@ -1,64 +1,1241 @@
 import sqlite3
+import threading
+import queue
+import csv
+import json
+import os
+import re
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import partial, wraps
 
 # Requisito: Nombre de la base de datos 'inventario.db' [cite: 9, 10]
 DB_NAME = 'inventario.db'
 
+# --- Configuración de la Sesión SQLite ---
+
+# PRAGMAs que se aplican una sola vez al crear cada conexión (no en cada operación).
+PRAGMAS_SESION = (
+    ('journal_mode', 'WAL'),       # Lectores y escritor concurrentes sin bloquearse
+    ('synchronous', 'NORMAL'),     # Con WAL es seguro y evita un fsync por cada commit
+    ('busy_timeout', 5000),        # Milisegundos de espera ante un bloqueo antes de fallar
+    ('mmap_size', 268435456),      # 256 MiB de lectura mapeada en memoria
+    ('cache_size', -20000),        # ~20 MB de caché de páginas (negativo = KiB)
+    ('temp_store', 'MEMORY'),      # Tablas temporales y ordenamientos en memoria
+)
+
+# Tamaño máximo del pool por archivo de base de datos y espera máxima por una conexión libre
+POOL_MAX_CONEXIONES = 8
+POOL_TIMEOUT = 30
+
 # --- Funciones de Utilidad de Conexión ---
 
-def get_db_connection():
-    """Retorna un objeto de conexión SQLite."""
-    conn = sqlite3.connect(DB_NAME)
+def _crear_conexion(ruta):
+    """Abre una conexión SQLite y aplica los PRAGMAs de sesión."""
+    # check_same_thread=False: el pool puede entregar la conexión a otro hilo más tarde,
+    # pero nunca a dos hilos a la vez.
+    conn = sqlite3.connect(ruta, check_same_thread=False)
     # Habilitar el acceso a las columnas por nombre (útil para la visualización)
     conn.row_factory = sqlite3.Row
+    for pragma, valor in PRAGMAS_SESION:
+        conn.execute(f"PRAGMA {pragma} = {valor}")
     return conn
 
-# --- Funciones CRUD y Setup ---
-def setup_database(): # ¡ESTA DEBE SER LA DEFINICIÓN EXACTA!
+def get_db_connection():
+    """
+    Retorna un objeto de conexión SQLite nuevo, fuera del pool.
+    Quien la pide es responsable de cerrarla; para operaciones normales usar conexion().
     """
-    Se conecta a la BD y crea la tabla 'productos' si no existe.
+    return _crear_conexion(base_actual())
+
+class PoolConexiones:
     """
+    Pool acotado de conexiones reutilizables a un mismo archivo de base de datos.
+    Como máximo 'max_conexiones' conexiones están prestadas a la vez; el resto espera.
+    """
+
+    def __init__(self, ruta, max_conexiones=POOL_MAX_CONEXIONES):
+        self.ruta = ruta
+        self.max_conexiones = max_conexiones
+        # LIFO: se reutiliza primero la conexión usada más recientemente (caché caliente)
+        self._libres = queue.LifoQueue()
+        self._cupos = threading.BoundedSemaphore(max_conexiones)
+        self._cerrado = False
+
+    def adquirir(self, timeout=POOL_TIMEOUT):
+        """Presta una conexión libre o crea una nueva si aún hay cupo."""
+        if not self._cupos.acquire(timeout=timeout):
+            raise sqlite3.OperationalError(
+                f"No hay conexiones libres en el pool de '{self.ruta}' ({self.max_conexiones} en uso)."
+            )
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return _crear_conexion(self.ruta)
+        except Exception:
+            self._cupos.release()
+            raise
+
+    def liberar(self, conn):
+        """Devuelve una conexión al pool, descartando cualquier transacción abierta."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._cerrado:
+                conn.close()
+            else:
+                self._libres.put(conn)
+        except sqlite3.Error:
+            # Una conexión en mal estado no vuelve al pool
+            conn.close()
+        finally:
+            self._cupos.release()
+
+    def cerrar(self):
+        """Cierra las conexiones libres; las prestadas se cierran al devolverse."""
+        self._cerrado = True
+        while True:
+            try:
+                self._libres.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Conexión prestada a cada hilo por archivo de base de datos: {ruta: {'conn', 'transaccion'}}
+_local = threading.local()
+
+def _obtener_pool(ruta):
+    with _pools_lock:
+        pool = _pools.get(ruta)
+        if pool is None:
+            pool = _pools[ruta] = PoolConexiones(ruta)
+        return pool
+
+def _sesiones_del_hilo():
+    sesiones = getattr(_local, 'sesiones', None)
+    if sesiones is None:
+        sesiones = _local.sesiones = {}
+    return sesiones
+
+# Base fijada con usar_base(); una ContextVar es propia de cada hilo y de cada tarea asyncio
+_base = ContextVar('base', default=None)
+
+def base_actual():
+    """Ruta de la base de datos con la que trabaja este hilo: la fijada con usar_base() o DB_NAME."""
+    return _base.get() or DB_NAME
+
+@contextmanager
+def usar_base(ruta):
+    """
+    Dentro del bloque, las funciones de este módulo trabajan sobre 'ruta' en lugar de
+    DB_NAME (por ejemplo, la base de un almacén). Solo afecta al hilo (o a la tarea
+    asyncio) actual; los hilos que se creen dentro del bloque empiezan con DB_NAME.
+    """
+    token = _base.set(ruta)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Creación de la tabla 'productos' con las columnas requeridas [cite: 11]
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS productos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,  -- Identificador único [cite: 13]
-                nombre TEXT NOT NULL,                 -- Nombre del producto (no nulo) [cite: 14]
-                descripcion TEXT,                     -- Breve descripción [cite: 15, 16]
-                cantidad INTEGER NOT NULL,            -- Cantidad (entero, no nulo) [cite: 17, 18]
-                precio REAL NOT NULL,                 -- Precio (real, no nulo) [cite: 19]
-                categoria TEXT                        -- Categoría del producto [cite: 20, 21]
+        yield ruta
+    finally:
+        _base.reset(token)
+
+@contextmanager
+def conexion(ruta=None):
+    """
+    Presta una conexión del pool durante todo el bloque 'with'.
+    Las llamadas anidadas en el mismo hilo comparten la misma conexión, de modo que
+    una operación completa usa una sola conexión aunque llame a varias funciones.
+    """
+    ruta = ruta or base_actual()
+    sesiones = _sesiones_del_hilo()
+    sesion = sesiones.get(ruta)
+    if sesion is not None:
+        yield sesion['conn']
+        return
+
+    pool = _obtener_pool(ruta)
+    conn = pool.adquirir()
+    _configurar_trazas(conn)
+    sesiones[ruta] = {'conn': conn, 'transaccion': False, 'al_confirmar': []}
+    try:
+        yield conn
+    finally:
+        del sesiones[ruta]
+        pool.liberar(conn)
+
+@contextmanager
+def transaccion(ruta=None):
+    """
+    Ejecuta el bloque dentro de una única transacción: commit al salir, rollback si hay error.
+    Si ya hay una transacción abierta en este hilo, el bloque se une a ella y solo
+    la transacción más externa confirma los cambios.
+    """
+    ruta = ruta or base_actual()
+    with conexion(ruta) as conn:
+        sesion = _sesiones_del_hilo()[ruta]
+        if sesion['transaccion']:
+            yield conn
+            return
+
+        # IMMEDIATE toma el bloqueo de escritura al inicio y evita fallos al escalar de lectura a escritura
+        conn.execute("BEGIN IMMEDIATE")
+        sesion['transaccion'] = True
+        try:
+            yield conn
+            instrumentacion = _instrumentacion
+            if instrumentacion is None:
+                conn.commit()
+            else:
+                inicio = time.perf_counter()
+                conn.commit()
+                instrumentacion.registrar_commit((time.perf_counter() - inicio) * 1000)
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            sesion['transaccion'] = False
+            pendientes, sesion['al_confirmar'] = sesion['al_confirmar'], []
+        for funcion in pendientes:
+            funcion()
+
+def fijar_conexion_hilo(ruta=None):
+    """
+    Asigna al hilo actual una conexión propia, fuera del pool, que conexion() y
+    transaccion() reutilizarán en este hilo hasta liberar_conexion_hilo().
+    Pensado para hilos de trabajo de larga vida (por ejemplo, los de database_async).
+    """
+    ruta = ruta or base_actual()
+    sesiones = _sesiones_del_hilo()
+    if ruta not in sesiones:
+        conn = _crear_conexion(ruta)
+        _configurar_trazas(conn)
+        sesiones[ruta] = {'conn': conn, 'transaccion': False, 'al_confirmar': []}
+    return sesiones[ruta]['conn']
+
+def liberar_conexion_hilo(ruta=None):
+    """Cierra la conexión fijada al hilo actual con fijar_conexion_hilo()."""
+    sesion = _sesiones_del_hilo().pop(ruta or base_actual(), None)
+    if sesion is not None:
+        sesion['conn'].close()
+
+def _en_transaccion(ruta):
+    sesion = _sesiones_del_hilo().get(ruta)
+    return sesion is not None and sesion['transaccion']
+
+def _al_confirmar(ruta, funcion):
+    """
+    Ejecuta 'funcion' cuando la transacción abierta en este hilo se confirme
+    (se descarta si hace rollback). Sin transacción abierta, la ejecuta de inmediato.
+    """
+    sesion = _sesiones_del_hilo().get(ruta)
+    if sesion is not None and sesion['transaccion']:
+        sesion['al_confirmar'].append(funcion)
+    else:
+        funcion()
+
+def cerrar_conexiones():
+    """Cierra todos los pools (por ejemplo, al salir de la aplicación)."""
+    # Primero se confirman las escrituras que esperan en el coordinador
+    desactivar_coordinador_escritura()
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.cerrar()
+
+# --- Caché de Lecturas ---
+
+class CacheLRU:
+    """
+    Caché en memoria de tamaño acotado: expulsa la entrada usada hace más tiempo (LRU)
+    y descarta las que superan 'ttl' segundos. Cada entrada lleva etiquetas
+    (por ejemplo, los IDs de producto que contiene) para invalidarla con precisión.
+    """
+
+    def __init__(self, capacidad=1024, ttl=30.0):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self._datos = OrderedDict()   # clave -> (vence, valor, etiquetas)
+        self._por_etiqueta = {}       # etiqueta -> set(claves)
+        self._lock = threading.Lock()
+        # Aumenta con cada invalidación; una lectura iniciada antes no se guarda
+        self.generacion = 0
+        self.aciertos = self.fallos = self.expulsiones = self.vencidos = self.invalidaciones = 0
+
+    def obtener(self, clave):
+        """Retorna (True, valor) si la clave está vigente, o (False, None)."""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return False, None
+            if entrada[0] < time.monotonic():
+                self._quitar(clave)
+                self.vencidos += 1
+                self.fallos += 1
+                return False, None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return True, entrada[1]
+
+    def guardar(self, clave, valor, etiquetas=(), generacion=None):
+        """Guarda 'valor'; si hubo invalidaciones desde 'generacion', lo descarta por obsoleto."""
+        with self._lock:
+            if generacion is not None and generacion != self.generacion:
+                return
+            if clave in self._datos:
+                self._quitar(clave)
+            self._datos[clave] = (time.monotonic() + self.ttl, valor, etiquetas)
+            for etiqueta in etiquetas:
+                self._por_etiqueta.setdefault(etiqueta, set()).add(clave)
+            while len(self._datos) > self.capacidad:
+                self._quitar(next(iter(self._datos)))
+                self.expulsiones += 1
+
+    def invalidar(self, *etiquetas):
+        """Elimina todas las entradas marcadas con alguna de las etiquetas."""
+        with self._lock:
+            self.generacion += 1
+            for etiqueta in etiquetas:
+                for clave in self._por_etiqueta.pop(etiqueta, ()):
+                    if clave in self._datos:
+                        self._quitar(clave)
+                        self.invalidaciones += 1
+
+    def limpiar(self):
+        with self._lock:
+            self.generacion += 1
+            self.invalidaciones += len(self._datos)
+            self._datos.clear()
+            self._por_etiqueta.clear()
+
+    def _quitar(self, clave):
+        _, _, etiquetas = self._datos.pop(clave)
+        for etiqueta in etiquetas:
+            claves = self._por_etiqueta.get(etiqueta)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._por_etiqueta[etiqueta]
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._datos),
+                'capacidad': self.capacidad,
+                'ttl': self.ttl,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+                'expulsiones': self.expulsiones,
+                'vencidos': self.vencidos,
+                'invalidaciones': self.invalidaciones,
+            }
+
+# Caché opcional de buscar_producto(); None mientras no se active
+_cache = None
+
+def activar_cache(capacidad=1024, ttl=30.0):
+    """
+    Activa la caché de lecturas para búsquedas por ID y búsquedas repetidas.
+    Las escrituras hechas por este módulo la invalidan; 'ttl' acota cuánto puede
+    tardar en verse un cambio hecho por otro proceso sobre el mismo archivo.
+    """
+    global _cache
+    _cache = CacheLRU(capacidad, ttl)
+
+def desactivar_cache():
+    global _cache
+    _cache = None
+
+def estadisticas_cache():
+    """Retorna los contadores de la caché (aciertos, fallos, expulsiones, ...) o None si está inactiva."""
+    cache = _cache
+    return cache.estadisticas() if cache is not None else None
+
+def _invalidar_cache(ruta, id_producto=None, busquedas=False):
+    """
+    Tras confirmar la transacción, invalida las entradas que contienen 'id_producto'
+    y, si 'busquedas' es True, todos los resultados de búsqueda por texto de 'ruta'.
+    """
+    cache = _cache
+    if cache is None:
+        return
+    etiquetas = []
+    if id_producto is not None:
+        etiquetas.append(('producto', ruta, _id_como_entero(id_producto)))
+    if busquedas:
+        etiquetas.append(('busquedas', ruta))
+    _al_confirmar(ruta, lambda: cache.invalidar(*etiquetas))
+
+def _id_como_entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return valor
+
+# --- Instrumentación ---
+
+# Límites superiores (ms) de las cubetas del histograma de latencias; la última es "más lento"
+CUBETAS_LATENCIA_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf'))
+# El manejador de progreso de SQLite se invoca cada esta cantidad de instrucciones de la VM
+PASOS_PROGRESO = 1000
+# Sentencias que se guardan por operación para el registro de consultas lentas
+MAX_SENTENCIAS_POR_OPERACION = 20
+
+class Instrumentacion:
+    """
+    Métricas opcionales de las operaciones de este módulo: llamadas, errores, filas
+    retornadas, histograma de latencias, sentencias ejecutadas (vía el trace callback
+    de sqlite3), trabajo de la VM (vía el progress handler) y tiempo de commit.
+    Las operaciones que superan 'umbral_lento_ms' se guardan con su SQL en un
+    registro de consultas lentas (y, si se indica, en un archivo JSONL).
+    """
+
+    def __init__(self, umbral_lento_ms=100.0, ruta_log_lentas=None, max_lentas=200):
+        self.umbral_lento_ms = umbral_lento_ms
+        self.ruta_log_lentas = ruta_log_lentas
+        self.inicio = time.time()
+        self.operaciones = {}
+        self.commits = {'cantidad': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+        self.lentas = deque(maxlen=max_lentas)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _pila(self):
+        pila = getattr(self._local, 'pila', None)
+        if pila is None:
+            pila = self._local.pila = []
+        return pila
+
+    def iniciar(self, nombre):
+        contexto = {'operacion': nombre, 'inicio': time.perf_counter(), 'sentencias': [],
+                    'total_sentencias': 0, 'pasos_vm': 0, 'filas': None, 'error': False}
+        self._pila().append(contexto)
+        return contexto
+
+    def anotar(self, filas=None, error=False):
+        """Anota en la operación en curso de este hilo sus filas reales o que falló."""
+        pila = self._pila()
+        if not pila:
+            return
+        if filas is not None:
+            pila[-1]['filas'] = filas
+        pila[-1]['error'] = pila[-1]['error'] or error
+
+    def finalizar(self, contexto, resultado=None, error=False):
+        pila = self._pila()
+        pila.pop()
+        duracion_ms = (time.perf_counter() - contexto['inicio']) * 1000
+        error = error or contexto['error']
+        filas = contexto['filas']
+        if filas is None:
+            # Las lecturas retornan listas de filas; otros resultados no cuentan como filas
+            filas = len(resultado) if isinstance(resultado, list) else 0
+        if pila:
+            # Las sentencias de una operación anidada también cuentan para la que la llamó
+            externo = pila[-1]
+            externo['total_sentencias'] += contexto['total_sentencias']
+            externo['pasos_vm'] += contexto['pasos_vm']
+            espacio = MAX_SENTENCIAS_POR_OPERACION - len(externo['sentencias'])
+            externo['sentencias'].extend(contexto['sentencias'][:max(0, espacio)])
+
+        with self._lock:
+            metricas = self.operaciones.get(contexto['operacion'])
+            if metricas is None:
+                metricas = self.operaciones[contexto['operacion']] = {
+                    'llamadas': 0, 'errores': 0, 'filas': 0, 'sentencias': 0, 'pasos_vm': 0,
+                    'total_ms': 0.0, 'max_ms': 0.0, 'histograma': [0] * len(CUBETAS_LATENCIA_MS),
+                }
+            metricas['llamadas'] += 1
+            metricas['errores'] += error
+            metricas['filas'] += filas
+            metricas['sentencias'] += contexto['total_sentencias']
+            metricas['pasos_vm'] += contexto['pasos_vm'] * PASOS_PROGRESO
+            metricas['total_ms'] += duracion_ms
+            metricas['max_ms'] = max(metricas['max_ms'], duracion_ms)
+            metricas['histograma'][bisect_left(CUBETAS_LATENCIA_MS, duracion_ms)] += 1
+
+        if duracion_ms >= self.umbral_lento_ms:
+            self._registrar_lenta({
+                'fecha': datetime.now().isoformat(timespec='milliseconds'),
+                'operacion': contexto['operacion'],
+                'duracion_ms': round(duracion_ms, 3),
+                'filas': filas,
+                'error': bool(error),
+                'sentencias': contexto['sentencias'],
+            })
+
+    def _registrar_lenta(self, entrada):
+        with self._lock:
+            self.lentas.append(entrada)
+            if self.ruta_log_lentas:
+                with open(self.ruta_log_lentas, 'a', encoding='utf-8') as archivo:
+                    archivo.write(json.dumps(entrada, ensure_ascii=False) + '\n')
+
+    def trazar(self, sql):
+        """Trace callback de sqlite3: anota cada sentencia en la operación en curso."""
+        pila = self._pila()
+        if not pila:
+            return
+        contexto = pila[-1]
+        contexto['total_sentencias'] += 1
+        if len(contexto['sentencias']) < MAX_SENTENCIAS_POR_OPERACION:
+            contexto['sentencias'].append({
+                'inicio_ms': round((time.perf_counter() - contexto['inicio']) * 1000, 3),
+                'sql': ' '.join(sql.split())[:500],
+            })
+
+    def progreso(self):
+        """Progress handler de sqlite3: cuenta bloques de instrucciones de la VM."""
+        pila = self._pila()
+        if pila:
+            pila[-1]['pasos_vm'] += 1
+        return 0  # 0 = continuar la consulta
+
+    def registrar_commit(self, duracion_ms):
+        with self._lock:
+            self.commits['cantidad'] += 1
+            self.commits['total_ms'] += duracion_ms
+            self.commits['max_ms'] = max(self.commits['max_ms'], duracion_ms)
+
+    def reporte(self):
+        """Retorna una copia serializable a JSON de todas las métricas."""
+        with self._lock:
+            operaciones = {}
+            for nombre, m in self.operaciones.items():
+                operaciones[nombre] = dict(
+                    m,
+                    promedio_ms=m['total_ms'] / m['llamadas'],
+                    histograma={
+                        ('<= ' + str(limite) if limite != float('inf') else f'> {CUBETAS_LATENCIA_MS[-2]}'): n
+                        for limite, n in zip(CUBETAS_LATENCIA_MS, m['histograma'])
+                    },
+                )
+            return {
+                'desde': datetime.fromtimestamp(self.inicio).isoformat(timespec='seconds'),
+                'umbral_lento_ms': self.umbral_lento_ms,
+                'ruta_log_lentas': self.ruta_log_lentas,
+                'operaciones': operaciones,
+                'commits': dict(self.commits),
+                'consultas_lentas': list(self.lentas),
+                'cache': estadisticas_cache(),
+                'coordinador': estadisticas_coordinador(),
+            }
+
+# Instrumentación opcional; None mientras no se active (costo casi nulo)
+_instrumentacion = None
+
+def activar_instrumentacion(umbral_lento_ms=100.0, ruta_log_lentas=None):
+    """
+    Comienza a registrar métricas de cada operación y sentencia SQL.
+    Las operaciones de al menos 'umbral_lento_ms' van al registro de consultas lentas;
+    si se indica 'ruta_log_lentas', también se agregan a ese archivo (JSONL).
+    """
+    global _instrumentacion
+    _instrumentacion = Instrumentacion(umbral_lento_ms, ruta_log_lentas)
+
+def desactivar_instrumentacion():
+    global _instrumentacion
+    _instrumentacion = None
+
+def reporte_instrumentacion():
+    """Retorna las métricas acumuladas como diccionario, o None si la instrumentación está inactiva."""
+    instrumentacion = _instrumentacion
+    return instrumentacion.reporte() if instrumentacion is not None else None
+
+def exportar_instrumentacion(ruta):
+    """Guarda el reporte de instrumentación en un archivo JSON. Retorna False si está inactiva."""
+    reporte = reporte_instrumentacion()
+    if reporte is None:
+        return False
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(reporte, archivo, indent=2, ensure_ascii=False)
+    return True
+
+def _instrumentada(funcion=None, *, fallo=False):
+    """
+    Decorador: mide la función cuando la instrumentación está activa. 'fallo' es el valor
+    con el que la función informa que falló (False en las escrituras; None en las que
+    retornan un resultado); las que retornan [] tanto al fallar como sin resultados lo
+    anotan con _anotar_operacion(error=True) en su rama de error.
+    """
+    if funcion is None:
+        return partial(_instrumentada, fallo=fallo)
+
+    @wraps(funcion)
+    def envoltura(*args, **kwargs):
+        instrumentacion = _instrumentacion
+        if instrumentacion is None:
+            return funcion(*args, **kwargs)
+        contexto = instrumentacion.iniciar(funcion.__name__)
+        try:
+            resultado = funcion(*args, **kwargs)
+        except BaseException:
+            instrumentacion.finalizar(contexto, error=True)
+            raise
+        instrumentacion.finalizar(contexto, resultado, error=resultado is fallo)
+        return resultado
+    return envoltura
+
+def _anotar_operacion(filas=None, error=False):
+    """Corrige lo que la instrumentación registrará para la operación en curso de este hilo."""
+    instrumentacion = _instrumentacion
+    if instrumentacion is not None:
+        instrumentacion.anotar(filas, error)
+
+def _configurar_trazas(conn):
+    """Instala (o quita) los callbacks de trace y progreso según la instrumentación activa."""
+    instrumentacion = _instrumentacion
+    if instrumentacion is None:
+        conn.set_trace_callback(None)
+        conn.set_progress_handler(None, 0)
+    else:
+        conn.set_trace_callback(instrumentacion.trazar)
+        conn.set_progress_handler(instrumentacion.progreso, PASOS_PROGRESO)
+
+# --- Coordinador de Escritura ---
+
+# Espera máxima (ms) para sumar más operaciones a un grupo antes de confirmarlo
+VENTANA_GRUPO_MS = 2.0
+# Operaciones máximas por transacción de grupo
+MAX_OPERACIONES_GRUPO = 256
+# Operaciones en espera antes de frenar a quienes escriben (contrapresión)
+CAPACIDAD_COLA_ESCRITURA = 4096
+
+class CoordinadorDetenido(RuntimeError):
+    """La operación no se aplicó porque el coordinador de escritura ya se detuvo."""
+
+
+class CoordinadorEscritura:
+    """
+    Único escritor para un archivo de base de datos. Las mutaciones de todos los hilos
+    se encolan y un hilo dedicado las aplica en grupos: las que llegan dentro de la
+    misma ventana comparten una transacción y un solo commit (group commit), sin
+    competir por el bloqueo de escritura. Cada operación corre en su propio SAVEPOINT,
+    así que la que falla se revierte sin arrastrar a las demás del grupo.
+    Con la cola llena, enviar() bloquea al llamador hasta que haya lugar.
+    """
+
+    def __init__(self, ruta, ventana_ms=VENTANA_GRUPO_MS, max_grupo=MAX_OPERACIONES_GRUPO,
+                 capacidad=CAPACIDAD_COLA_ESCRITURA):
+        self.ruta = ruta
+        self.ventana = ventana_ms / 1000
+        self.max_grupo = max_grupo
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._lock = threading.Lock()
+        # Serializa el encolado con la parada: ninguna tarea entra a la cola después del centinela.
+        # Es otro lock porque el hilo escritor toma _lock y un put() puede esperar a que vacíe la cola
+        self._lock_envio = threading.Lock()
+        self._detenido = False
+        self.grupos = 0
+        self.operaciones = 0
+        self.grupos_fallidos = 0
+        self.esperas_cola_llena = 0
+        self.max_operaciones_grupo = 0
+        self._hilo = threading.Thread(target=self._ejecutar, name='coordinador-escritura', daemon=True)
+        self._hilo.start()
+
+    def enviar(self, funcion, args=(), kwargs=None, timeout=POOL_TIMEOUT):
+        """
+        Encola funcion(*args, **kwargs) y retorna un Future con su resultado, disponible
+        cuando el grupo que la contiene se confirma. Si la cola está llena espera hasta
+        'timeout' segundos y luego lanza queue.Full; si el coordinador está detenido,
+        lanza CoordinadorDetenido.
+        """
+        futuro = Future()
+        tarea = (funcion, args, kwargs or {}, futuro)
+        if not self._lock_envio.acquire(timeout=timeout):
+            raise queue.Full
+        try:
+            if self._detenido:
+                raise CoordinadorDetenido("El coordinador de escritura está detenido.")
+            try:
+                self._cola.put_nowait(tarea)
+            except queue.Full:
+                with self._lock:
+                    self.esperas_cola_llena += 1
+                self._cola.put(tarea, timeout=timeout)
+        finally:
+            self._lock_envio.release()
+        return futuro
+
+    def detener(self):
+        """Aplica las operaciones pendientes y termina el hilo escritor."""
+        with self._lock_envio:
+            if not self._detenido:
+                self._detenido = True
+                self._cola.put(None)
+        self._hilo.join()
+        # Si el hilo terminó antes de tiempo, ningún llamador debe quedar esperando para siempre
+        while True:
+            try:
+                tarea = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if tarea is not None and tarea[3].set_running_or_notify_cancel():
+                tarea[3].set_exception(CoordinadorDetenido("El coordinador de escritura está detenido."))
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'grupos': self.grupos,
+                'operaciones': self.operaciones,
+                'operaciones_por_grupo': self.operaciones / self.grupos if self.grupos else 0.0,
+                'max_operaciones_grupo': self.max_operaciones_grupo,
+                'grupos_fallidos': self.grupos_fallidos,
+                'esperas_cola_llena': self.esperas_cola_llena,
+                'en_cola': self._cola.qsize(),
+            }
+
+    def _ejecutar(self):
+        # El hilo escritor conserva una única conexión propia durante toda su vida, y las
+        # funciones encoladas trabajan sobre la base del coordinador aunque no sea DB_NAME
+        fijar_conexion_hilo(self.ruta)
+        try:
+            with usar_base(self.ruta):
+                detenido = False
+                while not detenido or not self._cola.empty():
+                    grupo, fin = self._siguiente_grupo(bloquear=not detenido)
+                    detenido = detenido or fin
+                    if grupo:
+                        self._aplicar(grupo)
+        finally:
+            liberar_conexion_hilo(self.ruta)
+
+    def _siguiente_grupo(self, bloquear=True):
+        """Toma la primera operación (esperándola) y suma las que lleguen dentro de la ventana."""
+        grupo = []
+        limite = None
+        while len(grupo) < self.max_grupo:
+            try:
+                if not grupo and bloquear:
+                    tarea = self._cola.get()
+                elif limite is not None and limite > time.monotonic():
+                    tarea = self._cola.get(timeout=limite - time.monotonic())
+                else:
+                    # Vencida la ventana se suma igual lo que ya está en cola
+                    tarea = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if tarea is None:
+                return grupo, True
+            grupo.append(tarea)
+            if limite is None:
+                limite = time.monotonic() + self.ventana
+        return grupo, False
+
+    def _aplicar(self, grupo):
+        """Aplica el grupo en una transacción y entrega cada resultado tras el commit."""
+        aceptadas = [tarea for tarea in grupo if tarea[3].set_running_or_notify_cancel()]
+        resultados = []
+        try:
+            with transaccion(self.ruta) as conn:
+                for funcion, args, kwargs, _ in aceptadas:
+                    conn.execute("SAVEPOINT operacion")
+                    try:
+                        resultado, error = funcion(*args, **kwargs), None
+                    except Exception as e:
+                        resultado, error = False, e
+                    if resultado is False:
+                        # Las funciones de escritura informan los errores retornando False
+                        conn.execute("ROLLBACK TO operacion")
+                    conn.execute("RELEASE operacion")
+                    resultados.append((resultado, error))
+        except sqlite3.Error as e:
+            with self._lock:
+                self.grupos_fallidos += 1
+            for *_, futuro in aceptadas:
+                futuro.set_exception(e)
+            return
+
+        with self._lock:
+            self.grupos += 1
+            self.operaciones += len(aceptadas)
+            self.max_operaciones_grupo = max(self.max_operaciones_grupo, len(aceptadas))
+        for (*_, futuro), (resultado, error) in zip(aceptadas, resultados):
+            if error is not None:
+                futuro.set_exception(error)
+            else:
+                futuro.set_result(resultado)
+
+# Coordinador opcional de escrituras; None mientras no se active
+_coordinador = None
+
+def activar_coordinador_escritura(ventana_ms=VENTANA_GRUPO_MS, max_grupo=MAX_OPERACIONES_GRUPO,
+                                  capacidad=CAPACIDAD_COLA_ESCRITURA):
+    """
+    Canaliza registrar_producto, actualizar_producto y eliminar_producto de todos los
+    hilos a través de un único escritor con group commit sobre la base actual. Cada llamador
+    sigue recibiendo su propio resultado; las llamadas hechas dentro de una transacción
+    abierta por el llamador se ejecutan en ella, sin pasar por la cola.
+    """
+    global _coordinador
+    desactivar_coordinador_escritura()
+    _coordinador = CoordinadorEscritura(base_actual(), ventana_ms, max_grupo, capacidad)
+
+def desactivar_coordinador_escritura():
+    """Aplica las escrituras pendientes y vuelve a que cada hilo confirme las suyas."""
+    global _coordinador
+    coordinador, _coordinador = _coordinador, None
+    if coordinador is not None:
+        coordinador.detener()
+
+def estadisticas_coordinador():
+    """Retorna los contadores del coordinador (grupos, operaciones por grupo, ...) o None si está inactivo."""
+    coordinador = _coordinador
+    return coordinador.estadisticas() if coordinador is not None else None
+
+def _coordinada(funcion):
+    """Decorador: con el coordinador activo, la escritura se delega al hilo escritor."""
+    @wraps(funcion)
+    def envoltura(*args, **kwargs):
+        coordinador = _coordinador
+        if coordinador is None or coordinador.ruta != base_actual() or _en_transaccion(coordinador.ruta):
+            return funcion(*args, **kwargs)
+        try:
+            futuro = coordinador.enviar(funcion, args, kwargs)
+        except queue.Full:
+            print("Error: la cola de escritura está llena; intente nuevamente más tarde.")
+            return False
+        except CoordinadorDetenido:
+            # El coordinador se detuvo entre la consulta y el envío
+            return funcion(*args, **kwargs)
+        try:
+            return futuro.result()
+        except CoordinadorDetenido:
+            # Se detuvo sin llegar a aplicarla: nada se escribió todavía
+            return funcion(*args, **kwargs)
+        except sqlite3.Error as e:
+            print(f"Error de BD al confirmar el grupo de escrituras: {e}")
+            return False
+    return envoltura
+
+# --- Esquema y Migraciones ---
+
+# Punto de reorden por defecto de cada producto (antes, umbral global del resumen por categoría)
+UMBRAL_BAJO_STOCK = 5
+# Condición de stock bajo vigente; {fila} es 'new.', 'old.' o '' según el contexto SQL
+_CONDICION_BAJO_STOCK = "{fila}cantidad <= {fila}punto_reorden"
+# Último evento de cada producto cuyo estado vigente en el feed es "en stock bajo"
+# (en SQLite, con MAX() las demás columnas se toman de la fila del máximo)
+_SQL_ULTIMOS_EVENTOS_BAJO_STOCK = (
+    "SELECT MAX(id) AS id, producto_id FROM eventos_reorden GROUP BY producto_id HAVING bajo_stock = 1"
+)
+
+def _migracion_tabla_productos(conn):
+    """Versión 1: tabla 'productos' original."""
+    # Creación de la tabla 'productos' con las columnas requeridas [cite: 11]
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS productos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,  -- Identificador único [cite: 13]
+            nombre TEXT NOT NULL,                 -- Nombre del producto (no nulo) [cite: 14]
+            descripcion TEXT,                     -- Breve descripción [cite: 15, 16]
+            cantidad INTEGER NOT NULL,            -- Cantidad (entero, no nulo) [cite: 17, 18]
+            precio REAL NOT NULL,                 -- Precio (real, no nulo) [cite: 19]
+            categoria TEXT                        -- Categoría del producto [cite: 20, 21]
+        )
+    ''')
+
+def _migracion_indice_texto(conn):
+    """
+    Versión 2: crea el índice de texto completo FTS5 sobre nombre, descripción y categoría,
+    junto con los triggers que lo mantienen sincronizado con 'productos'.
+    Si el índice no existía (base de datos previa), lo llena con los productos actuales.
+    """
+    existia = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'productos_fts'"
+    ).fetchone() is not None
+    try:
+        # Tabla de contenido externo: el índice no duplica el texto, lo lee de 'productos'.
+        # prefix='2 3' precalcula prefijos cortos para que las búsquedas 'lap*' sean rápidas.
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS productos_fts USING fts5(
+                nombre, descripcion, categoria,
+                content='productos', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
             )
         ''')
-        
-        conn.commit()
+    except sqlite3.OperationalError:
+        # SQLite compilado sin FTS5: las búsquedas de texto usan LIKE
+        return
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS productos_fts_ai AFTER INSERT ON productos BEGIN
+            INSERT INTO productos_fts (rowid, nombre, descripcion, categoria)
+            VALUES (new.id, new.nombre, new.descripcion, new.categoria);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS productos_fts_ad AFTER DELETE ON productos BEGIN
+            INSERT INTO productos_fts (productos_fts, rowid, nombre, descripcion, categoria)
+            VALUES ('delete', old.id, old.nombre, old.descripcion, old.categoria);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS productos_fts_au AFTER UPDATE OF nombre, descripcion, categoria ON productos BEGIN
+            INSERT INTO productos_fts (productos_fts, rowid, nombre, descripcion, categoria)
+            VALUES ('delete', old.id, old.nombre, old.descripcion, old.categoria);
+            INSERT INTO productos_fts (rowid, nombre, descripcion, categoria)
+            VALUES (new.id, new.nombre, new.descripcion, new.categoria);
+        END
+    ''')
+    if not existia:
+        conn.execute("INSERT INTO productos_fts (productos_fts) VALUES ('rebuild')")
+
+def _migracion_indices_secundarios(conn):
+    """Versión 3: índices para el reporte de stock bajo, la categoría y el nombre."""
+    # Devuelve el reporte de stock bajo ya ordenado por cantidad, sin recorrer la tabla
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_productos_cantidad ON productos (cantidad)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_productos_categoria ON productos (categoria)")
+    # NOCASE permite que LIKE 'valor%' (insensible a mayúsculas) use el índice
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_productos_nombre ON productos (nombre COLLATE NOCASE)")
+
+def _migracion_movimientos(conn):
+    """Versión 4: libro de movimientos de stock, de solo agregado."""
+    # Sin clave foránea: el historial se conserva aunque el producto se elimine
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS movimientos (
+            id INTEGER PRIMARY KEY,
+            producto_id INTEGER NOT NULL,
+            delta INTEGER NOT NULL,               -- Positivo: entrada; negativo: salida
+            cantidad_resultante INTEGER NOT NULL, -- Stock del producto después del movimiento
+            motivo TEXT,
+            referencia TEXT,                      -- Remito, pedido, etc.
+            fecha TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_movimientos_producto ON movimientos (producto_id, id)")
+    for operacion in ('UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS movimientos_sin_{operacion.lower()} BEFORE {operacion} ON movimientos BEGIN
+                SELECT RAISE(ABORT, 'El libro de movimientos es de solo agregado.');
+            END
+        ''')
+
+def _migracion_resumen_categorias(conn):
+    """
+    Versión 5: tabla de agregados por categoría (productos, unidades, valor y cantidad
+    con stock bajo), mantenida por triggers en cada INSERT, UPDATE y DELETE de 'productos'.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS resumen_categorias (
+            categoria TEXT PRIMARY KEY,     -- '' agrupa los productos sin categoría
+            productos INTEGER NOT NULL,
+            unidades INTEGER NOT NULL,
+            valor_total REAL NOT NULL,      -- Suma de cantidad * precio
+            bajo_stock INTEGER NOT NULL     -- Productos con stock bajo
+        ) WITHOUT ROWID
+    ''')
+    condicion = f"{{fila}}cantidad <= {UMBRAL_BAJO_STOCK}"
+    _crear_triggers_resumen(conn, condicion, 'cantidad, precio, categoria')
+    _recalcular_resumen(conn, condicion)
+
+def _crear_triggers_resumen(conn, condicion_bajo_stock, columnas):
+    """
+    (Re)crea los triggers que mantienen 'resumen_categorias'. 'condicion_bajo_stock' es
+    una expresión SQL con el marcador {fila} ('new.', 'old.' o '') que indica si el
+    producto tiene stock bajo; 'columnas' son las que disparan el trigger de UPDATE.
+    """
+    sumar = '''
+        INSERT INTO resumen_categorias (categoria, productos, unidades, valor_total, bajo_stock)
+        VALUES (COALESCE(new.categoria, ''), 1, new.cantidad, new.cantidad * new.precio, {bajo_new})
+        ON CONFLICT (categoria) DO UPDATE SET
+            productos = productos + 1,
+            unidades = unidades + excluded.unidades,
+            valor_total = valor_total + excluded.valor_total,
+            bajo_stock = bajo_stock + excluded.bajo_stock;
+    '''
+    restar = '''
+        UPDATE resumen_categorias SET
+            productos = productos - 1,
+            unidades = unidades - old.cantidad,
+            valor_total = valor_total - old.cantidad * old.precio,
+            bajo_stock = bajo_stock - ({bajo_old})
+        WHERE categoria = COALESCE(old.categoria, '');
+        DELETE FROM resumen_categorias WHERE categoria = COALESCE(old.categoria, '') AND productos <= 0;
+    '''
+    bajo = {
+        'bajo_new': condicion_bajo_stock.format(fila='new.'),
+        'bajo_old': condicion_bajo_stock.format(fila='old.'),
+    }
+    sumar, restar = sumar.format(**bajo), restar.format(**bajo)
+    for nombre in ('resumen_categorias_ai', 'resumen_categorias_ad', 'resumen_categorias_au'):
+        conn.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+    conn.execute(f"CREATE TRIGGER resumen_categorias_ai AFTER INSERT ON productos BEGIN {sumar} END")
+    conn.execute(f"CREATE TRIGGER resumen_categorias_ad AFTER DELETE ON productos BEGIN {restar} END")
+    conn.execute(f'''
+        CREATE TRIGGER resumen_categorias_au AFTER UPDATE OF {columnas} ON productos
+        BEGIN {restar} {sumar} END
+    ''')
+
+def _recalcular_resumen(conn, condicion_bajo_stock):
+    conn.execute("DELETE FROM resumen_categorias")
+    conn.execute(f'''
+        INSERT INTO resumen_categorias (categoria, productos, unidades, valor_total, bajo_stock)
+        SELECT COALESCE(categoria, ''), COUNT(*), SUM(cantidad), SUM(cantidad * precio),
+               SUM({condicion_bajo_stock.format(fila='')})
+        FROM productos
+        GROUP BY COALESCE(categoria, '')
+    ''')
+
+def _migracion_punto_reorden(conn):
+    """
+    Versión 6: punto de reorden por producto. El stock bajo pasa a ser
+    cantidad <= punto_reorden, con un índice parcial que contiene solo esos productos
+    y un registro de eventos cada vez que un producto cruza su umbral.
+    """
+    # Los productos existentes conservan el umbral global que usaba el resumen
+    conn.execute(f"ALTER TABLE productos ADD COLUMN punto_reorden INTEGER NOT NULL DEFAULT {UMBRAL_BAJO_STOCK}")
+    # Índice parcial: solo guarda los productos por reponer, así el reporte no recorre la tabla
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_productos_reorden ON productos (id) WHERE cantidad <= punto_reorden")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS eventos_reorden (
+            id INTEGER PRIMARY KEY,            -- Cursor del feed de cambios
+            producto_id INTEGER NOT NULL,
+            bajo_stock INTEGER NOT NULL,       -- 1: entró en stock bajo; 0: salió (repuesto o eliminado)
+            cantidad INTEGER NOT NULL,
+            punto_reorden INTEGER NOT NULL,
+            fecha TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS eventos_reorden_ai AFTER INSERT ON productos
+        WHEN new.cantidad <= new.punto_reorden BEGIN
+            INSERT INTO eventos_reorden (producto_id, bajo_stock, cantidad, punto_reorden)
+            VALUES (new.id, 1, new.cantidad, new.punto_reorden);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS eventos_reorden_au AFTER UPDATE OF cantidad, punto_reorden ON productos
+        WHEN (old.cantidad <= old.punto_reorden) != (new.cantidad <= new.punto_reorden) BEGIN
+            INSERT INTO eventos_reorden (producto_id, bajo_stock, cantidad, punto_reorden)
+            VALUES (new.id, new.cantidad <= new.punto_reorden, new.cantidad, new.punto_reorden);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS eventos_reorden_ad AFTER DELETE ON productos
+        WHEN old.cantidad <= old.punto_reorden BEGIN
+            INSERT INTO eventos_reorden (producto_id, bajo_stock, cantidad, punto_reorden)
+            VALUES (old.id, 0, old.cantidad, old.punto_reorden);
+        END
+    ''')
+    # El resumen por categoría pasa a contar el stock bajo según el punto de reorden de cada producto
+    _crear_triggers_resumen(conn, _CONDICION_BAJO_STOCK, 'cantidad, precio, categoria, punto_reorden')
+    _recalcular_resumen(conn, _CONDICION_BAJO_STOCK)
+
+def _migracion_seguimiento_cambios(conn):
+    """
+    Versión 7: seguimiento de cambios para réplicas en memoria (ver analitica.py).
+    Cada alta o modificación de un producto le asigna el siguiente valor de un contador
+    global en 'productos.version', y cada baja deja una lápida en 'productos_eliminados'.
+    Quien guardó la versión de su última lectura trae solo lo que cambió desde entonces.
+    """
+    conn.execute("ALTER TABLE productos ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_productos_version ON productos (version)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS control_cambios (
+            id INTEGER PRIMARY KEY CHECK (id = 1),  -- Una sola fila
+            version INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO control_cambios (id, version) VALUES (1, 0)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS productos_eliminados (
+            id INTEGER PRIMARY KEY,   -- ID del producto eliminado (AUTOINCREMENT no lo reutiliza)
+            version INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_productos_eliminados_version ON productos_eliminados (version)")
+    # Las escrituras están serializadas por SQLite, así que las versiones crecen en orden de commit
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS productos_version_ai AFTER INSERT ON productos BEGIN
+            UPDATE control_cambios SET version = version + 1 WHERE id = 1;
+            UPDATE productos SET version = (SELECT version FROM control_cambios WHERE id = 1) WHERE id = new.id;
+        END
+    ''')
+    # Solo las columnas de datos: la propia actualización de 'version' no vuelve a dispararlo
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS productos_version_au
+        AFTER UPDATE OF nombre, descripcion, cantidad, precio, categoria, punto_reorden ON productos BEGIN
+            UPDATE control_cambios SET version = version + 1 WHERE id = 1;
+            UPDATE productos SET version = (SELECT version FROM control_cambios WHERE id = 1) WHERE id = new.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS productos_version_ad AFTER DELETE ON productos BEGIN
+            UPDATE control_cambios SET version = version + 1 WHERE id = 1;
+            INSERT OR REPLACE INTO productos_eliminados (id, version)
+            VALUES (old.id, (SELECT version FROM control_cambios WHERE id = 1));
+        END
+    ''')
+
+def _migracion_version_en_sentencias(conn):
+    """
+    Versión 8: las escrituras de este módulo asignan 'version' en su propia sentencia
+    (ver _siguiente_version), en lugar de que un trigger vuelva a actualizar la fila recién
+    escrita. Los triggers de la versión 7 quedan solo para las escrituras que no la
+    asignan (SQL directo, otros programas): se saltean cuando 'version' ya cambió.
+    """
+    conn.execute("DROP TRIGGER IF EXISTS productos_version_ai")
+    conn.execute("DROP TRIGGER IF EXISTS productos_version_au")
+    conn.execute('''
+        CREATE TRIGGER productos_version_ai AFTER INSERT ON productos
+        WHEN new.version = 0 BEGIN
+            UPDATE control_cambios SET version = version + 1 WHERE id = 1;
+            UPDATE productos SET version = (SELECT version FROM control_cambios WHERE id = 1) WHERE id = new.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER productos_version_au
+        AFTER UPDATE OF nombre, descripcion, cantidad, precio, categoria, punto_reorden ON productos
+        WHEN new.version = old.version BEGIN
+            UPDATE control_cambios SET version = version + 1 WHERE id = 1;
+            UPDATE productos SET version = (SELECT version FROM control_cambios WHERE id = 1) WHERE id = new.id;
+        END
+    ''')
+
+def _migracion_eventos_iniciales_reorden(conn):
+    """
+    Versión 9: evento inicial para los productos que ya estaban en stock bajo cuando se
+    creó 'eventos_reorden' (versión 6), o que llegaron a él sin pasar por los triggers.
+    Así, quien lee el feed desde el principio conoce todos los productos por reponer.
+    """
+    conn.execute(f'''
+        INSERT INTO eventos_reorden (producto_id, bajo_stock, cantidad, punto_reorden)
+        SELECT id, 1, cantidad, punto_reorden FROM productos
+        WHERE cantidad <= punto_reorden
+          AND id NOT IN (SELECT producto_id FROM ({_SQL_ULTIMOS_EVENTOS_BAJO_STOCK}))
+        ORDER BY id
+    ''')
+
+# Lista ordenada de migraciones: (versión, función). La versión aplicada se guarda en
+# PRAGMA user_version; para cambiar el esquema se agrega una entrada al final, nunca se
+# modifica una ya publicada.
+MIGRACIONES = [
+    (1, _migracion_tabla_productos),
+    (2, _migracion_indice_texto),
+    (3, _migracion_indices_secundarios),
+    (4, _migracion_movimientos),
+    (5, _migracion_resumen_categorias),
+    (6, _migracion_punto_reorden),
+    (7, _migracion_seguimiento_cambios),
+    (8, _migracion_version_en_sentencias),
+    (9, _migracion_eventos_iniciales_reorden),
+]
+
+def version_esquema(ruta=None):
+    """Retorna la versión de esquema (PRAGMA user_version) de la base de datos."""
+    with conexion(ruta) as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def aplicar_migraciones(ruta=None):
+    """
+    Lleva la base de datos a la última versión de esquema, aplicando en orden solo las
+    migraciones pendientes dentro de una transacción (si una falla, no se aplica ninguna).
+    Retorna la tupla (version_anterior, version_actual).
+    """
+    with transaccion(ruta) as conn:
+        version_anterior = conn.execute("PRAGMA user_version").fetchone()[0]
+        version = version_anterior
+        for numero, migracion in MIGRACIONES:
+            if numero > version:
+                migracion(conn)
+                conn.execute(f"PRAGMA user_version = {numero}")
+                version = numero
+        if version != version_anterior:
+            # Actualiza las estadísticas del planificador para los índices nuevos
+            conn.execute("PRAGMA optimize")
+    return version_anterior, version
+
+# --- Funciones CRUD y Setup ---
+
+# Filas por página en la visualización paginada y por lectura en iterar_productos()
+TAMANO_PAGINA = 20
+TAMANO_PAGINA_ITERACION = 1000
+
+# Se determina en setup_database(): False si este SQLite no incluye FTS5
+FTS_DISPONIBLE = None
+
+# Las escrituras toman la versión de cambios vigente, que _siguiente_version() acaba de avanzar
+_SQL_VERSION_VIGENTE = "(SELECT version FROM control_cambios WHERE id = 1)"
+_SQL_SIGUIENTE_VERSION = "UPDATE control_cambios SET version = version + 1 WHERE id = 1"
+_SQL_INSERTAR_PRODUCTO = f'''
+    INSERT INTO productos (nombre, descripcion, cantidad, precio, categoria, version) 
+    VALUES (?, ?, ?, ?, ?, {_SQL_VERSION_VIGENTE})
+'''
+_SQL_INSERTAR_PRODUCTO_REORDEN = f'''
+    INSERT INTO productos (nombre, descripcion, cantidad, precio, categoria, punto_reorden, version)
+    VALUES (?, ?, ?, ?, ?, ?, {_SQL_VERSION_VIGENTE})
+'''
+_SQL_POR_ID = "SELECT * FROM productos WHERE id = ?"
+_SQL_PAGINA = "SELECT * FROM productos WHERE id > ? ORDER BY id LIMIT ?"
+_SQL_PAGINA_ANTERIOR = "SELECT * FROM productos WHERE id < ? ORDER BY id DESC LIMIT ?"
+_SQL_BUSQUEDA_FTS = '''
+    SELECT p.* FROM productos_fts f
+    JOIN productos p ON p.id = f.rowid
+    WHERE productos_fts MATCH ?
+    ORDER BY f.rank
+    LIMIT ?
+'''
+_SQL_NOMBRE_PREFIJO = "SELECT * FROM productos WHERE nombre LIKE ? LIMIT ?"
+_SQL_BAJO_STOCK = "SELECT * FROM productos WHERE cantidad <= ? ORDER BY cantidad ASC"
+
+def _siguiente_version(conn):
+    """
+    Avanza el contador de cambios (migración 7) dentro de la transacción en curso; las
+    sentencias que siguen asignan ese valor a 'version' con _SQL_VERSION_VIGENTE. Varias
+    filas de una misma transacción pueden compartirlo: quien lee solo necesita que
+    cada cambio confirmado tenga una versión mayor que la que ya leyó.
+    """
+    conn.execute(_SQL_SIGUIENTE_VERSION)
+
+@_instrumentada
+def setup_database(): # ¡ESTA DEBE SER LA DEFINICIÓN EXACTA!
+    """
+    Se conecta a la BD y crea o actualiza el esquema (tabla 'productos', índices, etc.).
+    """
+    global FTS_DISPONIBLE
+    try:
+        aplicar_migraciones()
+        with conexion() as conn:
+            FTS_DISPONIBLE = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'productos_fts'"
+            ).fetchone() is not None
         # Nota: En una aplicación real, esto solo se ejecutaría al inicio.
         # print("Base de datos inicializada correctamente.")
         
     except sqlite3.Error as e:
         print(f"Error al inicializar la base de datos: {e}")
-    finally:
-        if conn:
-            conn.close()
+        _anotar_operacion(error=True)
 
-def registrar_producto(nombre, descripcion, cantidad, precio, categoria):
+@_instrumentada
+@_coordinada
+def registrar_producto(nombre, descripcion, cantidad, precio, categoria, punto_reorden=None):
     """
     Inserta un nuevo producto en la tabla 'productos'. [cite: 29, 30]
+    Sin 'punto_reorden', el producto usa el valor por defecto (UMBRAL_BAJO_STOCK).
     Retorna True si la inserción fue exitosa, False en caso contrario.
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Sentencia SQL para insertar el nuevo registro
-        cursor.execute('''
-            INSERT INTO productos (nombre, descripcion, cantidad, precio, categoria) 
-            VALUES (?, ?, ?, ?, ?)
-        ''', (nombre, descripcion, cantidad, precio, categoria))
-        
-        conn.commit()
+        with transaccion() as conn:
+            _siguiente_version(conn)
+            # Sentencia SQL para insertar el nuevo registro
+            if punto_reorden is None:
+                cursor = conn.execute(_SQL_INSERTAR_PRODUCTO, (nombre, descripcion, cantidad, precio, categoria))
+            else:
+                cursor = conn.execute(
+                    _SQL_INSERTAR_PRODUCTO_REORDEN, (nombre, descripcion, cantidad, precio, categoria, punto_reorden)
+                )
+            # Un producto nuevo puede aparecer en búsquedas ya cacheadas
+            _invalidar_cache(base_actual(), cursor.lastrowid, busquedas=True)
         return True
     except sqlite3.IntegrityError:
         # Esto capturaría errores como 'nombre' siendo NULL (aunque ya lo validaremos)
@@ -67,131 +1244,819 @@ def registrar_producto(nombre, descripcion, cantidad, precio, categoria):
     except sqlite3.Error as e:
         print(f"Error de BD al registrar: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
 
+@_instrumentada
 def visualizar_productos():
     """
     Obtiene y retorna todos los productos registrados. [cite: 31, 32]
+    Carga la tabla completa en memoria; para inventarios grandes usar iterar_productos()
+    u obtener_pagina().
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM productos ORDER BY id")
-        # El uso de 'conn.row_factory = sqlite3.Row' permite iterar sobre los resultados 
-        # como diccionarios, lo que es útil para imprimir.
-        productos = cursor.fetchall()
-        return productos
+        with conexion() as conn:
+            cursor = conn.execute("SELECT * FROM productos ORDER BY id")
+            # El uso de 'conn.row_factory = sqlite3.Row' permite iterar sobre los resultados 
+            # como diccionarios, lo que es útil para imprimir.
+            return cursor.fetchall()
     except sqlite3.Error as e:
         print(f"Error de BD al visualizar productos: {e}")
+        _anotar_operacion(error=True)
         return []
-    finally:
-        if conn:
-            conn.close()
 
-def actualizar_producto(id_producto, nombre, descripcion, cantidad, precio, categoria):
+@_instrumentada
+def obtener_pagina(despues_de_id=0, limite=TAMANO_PAGINA):
+    """
+    Retorna hasta 'limite' productos con ID mayor a 'despues_de_id', ordenados por ID.
+    Paginación por clave (keyset): cada página es una búsqueda por el índice de la clave
+    primaria, sin OFFSET, por lo que su costo no crece con la posición en la tabla.
+    """
+    try:
+        with conexion() as conn:
+            cursor = conn.execute(_SQL_PAGINA, (despues_de_id, limite))
+            return cursor.fetchall()
+    except sqlite3.Error as e:
+        print(f"Error de BD al obtener la página: {e}")
+        _anotar_operacion(error=True)
+        return []
+
+@_instrumentada
+def obtener_pagina_anterior(antes_de_id, limite=TAMANO_PAGINA):
+    """
+    Retorna hasta 'limite' productos con ID menor a 'antes_de_id', en orden ascendente de ID
+    (la página que precede a la que empieza en 'antes_de_id').
+    """
+    try:
+        with conexion() as conn:
+            # Se lee hacia atrás por la clave primaria y se invierte la página en memoria
+            cursor = conn.execute(_SQL_PAGINA_ANTERIOR, (antes_de_id, limite))
+            return cursor.fetchall()[::-1]
+    except sqlite3.Error as e:
+        print(f"Error de BD al obtener la página: {e}")
+        _anotar_operacion(error=True)
+        return []
+
+def iterar_productos(tamano_pagina=TAMANO_PAGINA_ITERACION, despues_de_id=0):
+    """
+    Genera todos los productos ordenados por ID, leyendo de a 'tamano_pagina' filas.
+    Solo una página vive en memoria a la vez y la conexión se devuelve al pool entre
+    páginas, así que el consumo es constante sin importar el tamaño de la tabla.
+    Cada página es una llamada a obtener_pagina() y así la mide la instrumentación
+    (el tiempo entre páginas es del consumidor, no de la base de datos).
+    """
+    while True:
+        pagina = obtener_pagina(despues_de_id, tamano_pagina)
+        yield from pagina
+        if len(pagina) < tamano_pagina:
+            return
+        despues_de_id = pagina[-1]['id']
+
+@_instrumentada
+@_coordinada
+def actualizar_producto(id_producto, nombre, descripcion, cantidad, precio, categoria, punto_reorden=None):
     """
     Actualiza los datos de un producto específico mediante su ID. [cite: 33]
+    Si 'punto_reorden' es None, se conserva el actual.
     Retorna True si se actualizó al menos un registro.
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Sentencia SQL para actualizar. Usamos WHERE id = ? para asegurar la actualización 
-        # solo al producto específico.
-        cursor.execute('''
-            UPDATE productos 
-            SET nombre = ?, descripcion = ?, cantidad = ?, precio = ?, categoria = ? 
-            WHERE id = ?
-        ''', (nombre, descripcion, cantidad, precio, categoria, id_producto))
-        
-        conn.commit()
+        with transaccion() as conn:
+            # Sentencia SQL para actualizar. Usamos WHERE id = ? para asegurar la actualización 
+            # solo al producto específico.
+            _siguiente_version(conn)
+            cursor = conn.execute(f'''
+                UPDATE productos 
+                SET nombre = ?, descripcion = ?, cantidad = ?, precio = ?, categoria = ?,
+                    punto_reorden = COALESCE(?, punto_reorden), version = {_SQL_VERSION_VIGENTE}
+                WHERE id = ?
+            ''', (nombre, descripcion, cantidad, precio, categoria, punto_reorden, id_producto))
+            _invalidar_cache(base_actual(), id_producto, busquedas=True)
         # Verificar si se actualizó algún registro
         return cursor.rowcount > 0
     except sqlite3.Error as e:
         print(f"Error de BD al actualizar: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
 
+@_instrumentada
+@_coordinada
 def eliminar_producto(id_producto):
     """
     Elimina un producto mediante su ID. [cite: 34]
     Retorna True si se eliminó al menos un registro.
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Sentencia SQL para eliminar el producto
-        cursor.execute("DELETE FROM productos WHERE id = ?", (id_producto,))
-        
-        conn.commit()
+        with transaccion() as conn:
+            # Sentencia SQL para eliminar el producto
+            cursor = conn.execute("DELETE FROM productos WHERE id = ?", (id_producto,))
+            # Solo las entradas que contenían este producto quedan obsoletas
+            _invalidar_cache(base_actual(), id_producto)
         # rowcount indica el número de filas afectadas
         return cursor.rowcount > 0
     except sqlite3.Error as e:
         print(f"Error de BD al eliminar: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
 
-def buscar_producto(criterio, valor):
+def _expresion_fts(valor, columna=None):
+    """
+    Convierte el texto ingresado en una consulta FTS5 de prefijos: 'lap gam' -> "lap"* AND "gam"*.
+    Retorna None si el texto no contiene ninguna palabra buscable.
+    """
+    terminos = re.findall(r'\w+', str(valor))
+    if not terminos:
+        return None
+    expresion = ' AND '.join(f'"{termino}"*' for termino in terminos)
+    return f'{columna} : ({expresion})' if columna else expresion
+
+@_instrumentada
+def buscar_producto(criterio, valor, limite=None):
     """
-    Busca productos por ID, nombre o categoría. [cite: 35]
-    Retorna una lista de productos encontrados.
+    Busca productos por ID, nombre, categoría o texto libre. [cite: 35]
+    Las búsquedas de texto usan el índice FTS5: cada palabra coincide por prefijo
+    ('lap' encuentra 'Laptop') y los resultados se ordenan por relevancia.
+    Sin FTS5, el nombre se busca por prefijo y el resto por subcadena con LIKE.
+    'texto' busca a la vez en nombre, descripción y categoría.
+    Retorna una lista de productos encontrados (como máximo 'limite' si se indica).
+    Si la caché está activa (activar_cache()), los resultados repetidos se sirven desde memoria.
     """
-    conn = None
+    # Sanitización básica del criterio para evitar inyección SQL en la cláusula del campo
+    if criterio not in ['id', 'nombre', 'categoria', 'texto']:
+        print("Criterio de búsqueda no válido.")
+        return []
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Sanitización básica del criterio para evitar inyección SQL en la cláusula del campo
-        if criterio not in ['id', 'nombre', 'categoria']:
-            print("Criterio de búsqueda no válido.")
-            return []
-            
-        # Sentencia SQL con LIKE para búsquedas parciales en texto, e = ? para ID
+        cache = _cache
+        base = base_actual()
+        # Dentro de una transacción propia pueden verse cambios aún no confirmados: no cachear
+        if cache is None or _en_transaccion(base):
+            return _buscar_en_bd(criterio, valor, limite)
+
+        clave = (base, criterio, str(valor), limite)
+        encontrado, productos = cache.obtener(clave)
+        if encontrado:
+            return list(productos)
+
+        generacion = cache.generacion
+        productos = _buscar_en_bd(criterio, valor, limite)
+        etiquetas = {('producto', base, p['id']) for p in productos}
         if criterio == 'id':
-            query = f"SELECT * FROM productos WHERE {criterio} = ?"
-            # El ID debe ser un valor exacto
-            cursor.execute(query, (valor,))
+            # También se cachea "no existe": se invalida cuando se registre ese ID
+            etiquetas.add(('producto', base, _id_como_entero(valor)))
         else:
-            query = f"SELECT * FROM productos WHERE {criterio} LIKE ?"
-            # Se usa % para permitir la búsqueda por subcadena
-            cursor.execute(query, (f'%{valor}%',))
-            
-        productos = cursor.fetchall()
+            etiquetas.add(('busquedas', base))
+        cache.guardar(clave, tuple(productos), tuple(etiquetas), generacion)
         return productos
     except sqlite3.Error as e:
         print(f"Error de BD al buscar: {e}")
+        _anotar_operacion(error=True)
         return []
-    finally:
-        if conn:
-            conn.close()
 
+def _buscar_en_bd(criterio, valor, limite):
+    """Ejecuta la búsqueda contra la base de datos (sin caché)."""
+    with conexion() as conn:
+        if criterio == 'id':
+            # El ID debe ser un valor exacto
+            cursor = conn.execute(_SQL_POR_ID, (valor,))
+        elif FTS_DISPONIBLE:
+            expresion = _expresion_fts(valor, None if criterio == 'texto' else criterio)
+            if expresion is None:
+                return []
+            cursor = conn.execute(_SQL_BUSQUEDA_FTS, (expresion, -1 if limite is None else limite))
+        elif criterio == 'nombre':
+            # Sin FTS5: prefijo con LIKE, que aprovecha el índice NOCASE sobre el nombre
+            cursor = conn.execute(_SQL_NOMBRE_PREFIJO, (f'{valor}%', -1 if limite is None else limite))
+        else:
+            # Sin FTS5: LIKE con % para permitir la búsqueda por subcadena
+            columnas = ['nombre', 'descripcion', 'categoria'] if criterio == 'texto' else [criterio]
+            condicion = ' OR '.join(f"{columna} LIKE ?" for columna in columnas)
+            cursor = conn.execute(
+                f"SELECT * FROM productos WHERE {condicion} LIMIT ?",
+                [f'%{valor}%'] * len(columnas) + [-1 if limite is None else limite],
+            )
+        return cursor.fetchall()
+
+@_instrumentada
 def reporte_bajo_stock(limite):
     """
     Genera un reporte de productos cuya cantidad es igual o inferior al límite. [cite: 36]
     Retorna una lista de productos con stock bajo.
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Sentencia SQL para encontrar productos donde cantidad <= limite
-        cursor.execute("SELECT * FROM productos WHERE cantidad <= ? ORDER BY cantidad ASC", (limite,))
-        
-        productos = cursor.fetchall()
-        return productos
+        with conexion() as conn:
+            # Sentencia SQL para encontrar productos donde cantidad <= limite
+            cursor = conn.execute(_SQL_BAJO_STOCK, (limite,))
+            return cursor.fetchall()
     except sqlite3.Error as e:
         print(f"Error de BD al generar reporte: {e}")
+        _anotar_operacion(error=True)
+        return []
+
+# --- Puntos de Reorden ---
+
+# El índice parcial idx_productos_reorden resuelve el WHERE y el orden por ID
+_SQL_REPORTE_REORDEN = "SELECT * FROM productos WHERE cantidad <= punto_reorden AND id > ? ORDER BY id LIMIT ?"
+_SQL_CAMBIOS_BAJO_STOCK = "SELECT * FROM eventos_reorden WHERE id > ? ORDER BY id LIMIT ?"
+
+@_instrumentada
+def definir_punto_reorden(id_producto, punto_reorden):
+    """Cambia el punto de reorden de un producto. Retorna True si el producto existe."""
+    try:
+        with transaccion() as conn:
+            cursor = conn.execute(
+                "UPDATE productos SET punto_reorden = ? WHERE id = ?", (punto_reorden, id_producto)
+            )
+            _invalidar_cache(base_actual(), id_producto)
+        return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        print(f"Error de BD al definir el punto de reorden: {e}")
+        return False
+
+@_instrumentada
+def reporte_reorden(despues_de_id=0, limite=-1):
+    """
+    Retorna los productos cuya cantidad es igual o inferior a su propio punto de reorden,
+    ordenados por ID (paginable con 'despues_de_id' y 'limite'). Lee solo el índice
+    parcial de productos por reponer, no la tabla completa.
+    """
+    try:
+        with conexion() as conn:
+            return conn.execute(_SQL_REPORTE_REORDEN, (despues_de_id, limite)).fetchall()
+    except sqlite3.Error as e:
+        print(f"Error de BD al generar el reporte de reorden: {e}")
+        _anotar_operacion(error=True)
+        return []
+
+def iterar_reorden(tamano_pagina=TAMANO_PAGINA_ITERACION):
+    """Genera los productos por reponer ordenados por ID, leyendo de a 'tamano_pagina' filas."""
+    despues_de_id = 0
+    while True:
+        pagina = reporte_reorden(despues_de_id, tamano_pagina)
+        yield from pagina
+        if len(pagina) < tamano_pagina:
+            return
+        despues_de_id = pagina[-1]['id']
+
+@_instrumentada
+def cambios_bajo_stock(desde=0, limite=1000):
+    """
+    Feed de cambios del reporte de reorden: retorna (eventos, cursor), donde 'eventos' son
+    los productos que entraron (bajo_stock=1) o salieron (bajo_stock=0) del stock bajo
+    después del cursor 'desde', y 'cursor' es el valor a pasar en la próxima consulta.
+    Un proceso que sondea solo lee lo que cambió, no el reporte completo.
+    """
+    try:
+        with conexion() as conn:
+            eventos = conn.execute(_SQL_CAMBIOS_BAJO_STOCK, (desde, limite)).fetchall()
+        _anotar_operacion(filas=len(eventos))
+        return eventos, (eventos[-1]['id'] if eventos else desde)
+    except sqlite3.Error as e:
+        print(f"Error de BD al consultar los cambios de stock bajo: {e}")
+        _anotar_operacion(error=True)
+        return [], desde
+
+@_instrumentada(fallo=None)
+def purgar_eventos_reorden(hasta=None, dias=None):
+    """
+    Borra del feed de cambios los eventos con cursor <= 'hasta' y/o con más de 'dias'
+    días (si se indican ambos, los que cumplan las dos condiciones). Se conserva el último
+    evento de cada producto que sigue en stock bajo, así que leer el feed desde 0 sigue
+    mostrando todos los productos por reponer.
+    Retorna la cantidad de eventos borrados, o None si falló la base de datos.
+    """
+    if hasta is None and dias is None:
+        raise ValueError("Indique hasta qué cursor ('hasta') o de cuántos días ('dias') purgar.")
+    condiciones, parametros = [f"id NOT IN (SELECT id FROM ({_SQL_ULTIMOS_EVENTOS_BAJO_STOCK}))"], []
+    if hasta is not None:
+        condiciones.append("id <= ?")
+        parametros.append(hasta)
+    if dias is not None:
+        condiciones.append("fecha < strftime('%Y-%m-%dT%H:%M:%fZ', 'now', ?)")
+        parametros.append(f"-{dias} days")
+    try:
+        with transaccion() as conn:
+            borrados = conn.execute(
+                f"DELETE FROM eventos_reorden WHERE {' AND '.join(condiciones)}", parametros
+            ).rowcount
+        _anotar_operacion(filas=borrados)
+        return borrados
+    except sqlite3.Error as e:
+        print(f"Error de BD al purgar los eventos de reorden: {e}")
+        return None
+
+# --- Resumen por Categoría ---
+
+@_instrumentada
+def recalcular_resumen_categorias():
+    """
+    Reconstruye 'resumen_categorias' desde cero a partir de 'productos'.
+    Los triggers lo mantienen al día; esto solo hace falta para corregir el redondeo
+    acumulado en 'valor_total' tras muchas actualizaciones.
+    Retorna True si se reconstruyó, False en caso contrario.
+    """
+    try:
+        with transaccion() as conn:
+            _recalcular_resumen(conn, _CONDICION_BAJO_STOCK)
+        return True
+    except sqlite3.Error as e:
+        print(f"Error de BD al recalcular el resumen por categoría: {e}")
+        return False
+
+@_instrumentada
+def reporte_categorias():
+    """
+    Retorna, por categoría, la cantidad de productos, unidades totales, valor del
+    inventario (cantidad * precio) y productos con stock bajo. Lee la tabla de agregados
+    precalculada: el costo depende de la cantidad de categorías, no de productos.
+    """
+    try:
+        with conexion() as conn:
+            cursor = conn.execute('''
+                SELECT categoria, productos, unidades, ROUND(valor_total, 2) AS valor_total, bajo_stock
+                FROM resumen_categorias
+                ORDER BY valor_total DESC
+            ''')
+            return cursor.fetchall()
+    except sqlite3.Error as e:
+        print(f"Error de BD al generar el resumen por categoría: {e}")
+        _anotar_operacion(error=True)
         return []
+
+# --- Seguimiento de Cambios ---
+
+_SQL_PRODUCTOS_CAMBIADOS = "SELECT {columnas} FROM productos WHERE version > ?"
+_SQL_PRODUCTOS_ELIMINADOS = "SELECT id FROM productos_eliminados WHERE version > ?"
+
+@contextmanager
+def lectura_cambios(desde_version=None, columnas='*'):
+    """
+    Abre una instantánea de lectura y entrega (version, productos, eliminados):
+    'version' es la versión de cambios vigente, 'productos' un cursor con las filas dadas
+    de alta o modificadas después de 'desde_version' (todas si es None), para leer con
+    fetchmany, y 'eliminados' la lista de IDs borrados desde entonces. Los tres
+    corresponden al mismo estado de la base aunque haya escrituras concurrentes.
+    'columnas' limita las columnas leídas (por ejemplo, 'id, cantidad').
+    """
+    with conexion() as conn:
+        propia = not conn.in_transaction
+        if propia:
+            # Con WAL, la instantánea queda fijada en la primera lectura de la transacción
+            conn.execute("BEGIN")
+        try:
+            version = conn.execute("SELECT version FROM control_cambios WHERE id = 1").fetchone()[0]
+            if desde_version is None:
+                productos = conn.execute(f"SELECT {columnas} FROM productos")
+                eliminados = []
+            else:
+                productos = conn.execute(_SQL_PRODUCTOS_CAMBIADOS.format(columnas=columnas), (desde_version,))
+                eliminados = [fila[0] for fila in conn.execute(_SQL_PRODUCTOS_ELIMINADOS, (desde_version,))]
+            yield version, productos, eliminados
+        finally:
+            if propia:
+                conn.rollback()
+
+# --- Movimientos de Stock ---
+
+_SQL_APLICAR_MOVIMIENTO = f'''
+    UPDATE productos SET cantidad = cantidad + ?, version = {_SQL_VERSION_VIGENTE}
+    WHERE id = ? AND cantidad + ? >= 0
+    RETURNING cantidad
+'''
+_SQL_INSERTAR_MOVIMIENTO = '''
+    INSERT INTO movimientos (producto_id, delta, cantidad_resultante, motivo, referencia)
+    VALUES (?, ?, ?, ?, ?)
+'''
+_SQL_HISTORIAL_MOVIMIENTOS = "SELECT * FROM movimientos WHERE producto_id = ? ORDER BY id DESC LIMIT ?"
+
+class MovimientoRechazado(Exception):
+    """El movimiento dejaría el stock en negativo o el producto no existe."""
+
+def _aplicar_movimiento(conn, id_producto, delta, motivo, referencia):
+    """
+    Aplica un delta en una sola sentencia (cantidad = cantidad + ?), de modo que dos
+    movimientos concurrentes nunca pisan el resultado del otro, y lo asienta en el libro.
+    Retorna la cantidad resultante o lanza MovimientoRechazado.
+    """
+    if isinstance(delta, bool) or not isinstance(delta, int):
+        raise MovimientoRechazado("El delta debe ser un número entero.")
+    _siguiente_version(conn)
+    fila = conn.execute(_SQL_APLICAR_MOVIMIENTO, (delta, id_producto, delta)).fetchone()
+    if fila is None:
+        # Solo en el caso de rechazo se consulta el motivo
+        if conn.execute("SELECT 1 FROM productos WHERE id = ?", (id_producto,)).fetchone() is None:
+            raise MovimientoRechazado(f"No existe el producto con ID {id_producto}.")
+        raise MovimientoRechazado(f"Stock insuficiente para el producto con ID {id_producto}.")
+    conn.execute(_SQL_INSERTAR_MOVIMIENTO, (id_producto, delta, fila[0], motivo, referencia))
+    _invalidar_cache(base_actual(), id_producto)
+    return fila[0]
+
+@_instrumentada(fallo=None)
+def registrar_movimiento(id_producto, delta, motivo=None, referencia=None):
+    """
+    Suma 'delta' (positivo: entrada, negativo: salida) al stock de un producto y lo
+    registra en el libro de movimientos. El stock nunca queda negativo.
+    Retorna la cantidad resultante, o None si el movimiento fue rechazado.
+    """
+    try:
+        with transaccion() as conn:
+            return _aplicar_movimiento(conn, id_producto, delta, motivo, referencia)
+    except MovimientoRechazado as e:
+        print(f"Movimiento rechazado: {e}")
+        return None
+    except sqlite3.Error as e:
+        print(f"Error de BD al registrar el movimiento: {e}")
+        return None
+
+@_instrumentada
+def registrar_movimientos(movimientos, atomico=False):
+    """
+    Aplica un lote de movimientos en una única transacción.
+    Cada movimiento es un diccionario {'id', 'delta', 'motivo', 'referencia'} o una tupla
+    (id, delta[, motivo[, referencia]]). Los rechazados no detienen el lote, salvo con
+    atomico=True, en cuyo caso cualquier rechazo revierte todos.
+    Retorna una lista con un resultado por movimiento: {'id', 'delta', 'ok', 'cantidad' | 'error'}.
+    """
+    movimientos = iter(movimientos)
+    resultados = []
+    try:
+        with transaccion() as conn:
+            for movimiento in movimientos:
+                id_producto, delta, motivo, referencia = _desarmar_movimiento(movimiento)
+                resultado = {'id': id_producto, 'delta': delta}
+                resultados.append(resultado)
+                try:
+                    resultado.update(ok=True, cantidad=_aplicar_movimiento(conn, id_producto, delta, motivo, referencia))
+                except MovimientoRechazado as e:
+                    resultado.update(ok=False, error=str(e))
+                    if atomico:
+                        raise
+    except MovimientoRechazado as e:
+        print(f"Lote de movimientos revertido: {e}")
+        _anotar_operacion(error=True)
+        return _lote_revertido(resultados, movimientos, e)
+    except sqlite3.Error as e:
+        print(f"Error de BD al registrar los movimientos: {e}")
+        _anotar_operacion(error=True)
+        return _lote_revertido(resultados, movimientos, e)
+    return resultados
+
+def _desarmar_movimiento(movimiento):
+    """Retorna (id, delta, motivo, referencia) de un movimiento en diccionario o tupla."""
+    if isinstance(movimiento, dict):
+        return movimiento.get('id'), movimiento.get('delta'), movimiento.get('motivo'), movimiento.get('referencia')
+    return (tuple(movimiento) + (None, None))[:4]
+
+def _lote_revertido(resultados, pendientes, motivo):
+    """
+    Resultados de un lote revertido: los movimientos ya aplicados y los que no llegaron a
+    intentarse (el resto de 'pendientes') se informan como revertidos; los rechazados
+    conservan su propio error.
+    """
+    revertidos = [
+        r if r.get('ok') is False else
+        {'id': r['id'], 'delta': r['delta'], 'ok': False, 'error': f"Lote revertido: {motivo}"}
+        for r in resultados
+    ]
+    for movimiento in pendientes:
+        try:
+            id_producto, delta = _desarmar_movimiento(movimiento)[:2]
+        except TypeError:
+            id_producto = delta = None
+        revertidos.append({'id': id_producto, 'delta': delta, 'ok': False, 'error': f"Lote revertido: {motivo}"})
+    return revertidos
+
+@_instrumentada
+def historial_movimientos(id_producto, limite=50):
+    """Retorna los últimos 'limite' movimientos de un producto, del más reciente al más antiguo."""
+    try:
+        with conexion() as conn:
+            cursor = conn.execute(_SQL_HISTORIAL_MOVIMIENTOS, (id_producto, limite))
+            return cursor.fetchall()
+    except sqlite3.Error as e:
+        print(f"Error de BD al consultar movimientos: {e}")
+        _anotar_operacion(error=True)
+        return []
+
+# --- Verificación de Índices ---
+
+# Consultas críticas de este módulo con parámetros de ejemplo, para revisar su plan.
+CONSULTAS_INDEXADAS = {
+    'buscar_producto (id)': (_SQL_POR_ID, (1,)),
+    'buscar_producto (texto, FTS5)': (_SQL_BUSQUEDA_FTS, ('"a"*', 10)),
+    'buscar_producto (nombre, sin FTS5)': (_SQL_NOMBRE_PREFIJO, ('a%', 10)),
+    'obtener_pagina / iterar_productos': (_SQL_PAGINA, (0, 10)),
+    'obtener_pagina_anterior': (_SQL_PAGINA_ANTERIOR, (100, 10)),
+    'reporte_bajo_stock': (_SQL_BAJO_STOCK, (5,)),
+    'reporte_reorden': (_SQL_REPORTE_REORDEN, (0, 100)),
+    'cambios_bajo_stock': (_SQL_CAMBIOS_BAJO_STOCK, (0, 100)),
+    'registrar_movimiento': (_SQL_APLICAR_MOVIMIENTO, (1, 1, 1)),
+    'historial_movimientos': (_SQL_HISTORIAL_MOVIMIENTOS, (1, 50)),
+    'lectura_cambios (productos)': (_SQL_PRODUCTOS_CAMBIADOS.format(columnas='*'), (1,)),
+    'lectura_cambios (eliminados)': (_SQL_PRODUCTOS_ELIMINADOS, (1,)),
+}
+
+def _plan_usa_indice(detalles):
+    """
+    Un plan es aceptable si no recorre 'productos' completa (SCAN sin índice)
+    ni necesita un B-tree temporal para ordenar.
+    """
+    for detalle in detalles:
+        if detalle.startswith('SCAN') and 'USING' not in detalle and 'VIRTUAL TABLE' not in detalle:
+            return False
+        if 'TEMP B-TREE' in detalle:
+            return False
+    return True
+
+@_instrumentada
+def verificar_planes_consulta(ruta=None):
+    """
+    Ejecuta EXPLAIN QUERY PLAN sobre cada consulta de CONSULTAS_INDEXADAS.
+    Retorna una lista de diccionarios {'consulta', 'plan', 'usa_indice'}.
+    """
+    resultados = []
+    with conexion(ruta) as conn:
+        for nombre, (sql, parametros) in CONSULTAS_INDEXADAS.items():
+            try:
+                filas = conn.execute(f"EXPLAIN QUERY PLAN {sql}", parametros).fetchall()
+            except sqlite3.OperationalError as e:
+                # Por ejemplo, la consulta FTS5 en un SQLite sin FTS5
+                resultados.append({'consulta': nombre, 'plan': [f"No disponible: {e}"], 'usa_indice': None})
+                continue
+            detalles = [fila['detail'] for fila in filas]
+            resultados.append({'consulta': nombre, 'plan': detalles, 'usa_indice': _plan_usa_indice(detalles)})
+    return resultados
+
+# --- Validación y Carga Masiva ---
+
+# Filas por cada executemany durante la importación masiva
+TAMANO_LOTE_IMPORTACION = 5000
+# Cantidad de rechazos que se conservan en memoria para mostrarlos (el resto solo se cuenta)
+MAX_MUESTRA_RECHAZOS = 20
+
+def validar_producto(nombre, descripcion, cantidad, precio, categoria):
+    """
+    Aplica las mismas reglas que el registro manual: nombre obligatorio,
+    cantidad entera >= 0 y precio real > 0.
+    Retorna la tupla normalizada lista para insertar o lanza ValueError con el motivo.
+    """
+    nombre = str(nombre).strip() if nombre is not None else ''
+    if not nombre:
+        raise ValueError("El nombre es obligatorio.")
+
+    try:
+        cantidad = cantidad if isinstance(cantidad, int) else int(str(cantidad).strip())
+        if cantidad < 0: raise ValueError
+    except (TypeError, ValueError):
+        raise ValueError("Cantidad debe ser un número entero positivo.") from None
+
+    try:
+        precio = float(precio)
+        if not precio > 0: raise ValueError
+    except (TypeError, ValueError):
+        raise ValueError("Precio debe ser un número real positivo.") from None
+
+    descripcion = str(descripcion).strip() if descripcion is not None else ''
+    categoria = str(categoria).strip() if categoria is not None else ''
+    return nombre, descripcion, cantidad, precio, categoria
+
+def _leer_filas_archivo(archivo, formato):
+    """Genera (numero_linea, dict) leyendo el archivo de forma incremental."""
+    if formato == 'csv':
+        lector = csv.DictReader(archivo)
+        for fila in lector:
+            yield lector.line_num, fila
+    else:
+        for numero, linea in enumerate(archivo, start=1):
+            if not linea.strip():
+                continue
+            try:
+                fila = json.loads(linea)
+            except json.JSONDecodeError as e:
+                fila = ValueError(f"JSON inválido: {e.msg}")
+            if not isinstance(fila, (dict, ValueError)):
+                fila = ValueError("Cada línea debe ser un objeto JSON.")
+            yield numero, fila
+
+@_instrumentada(fallo=None)
+def importar_productos(ruta, formato=None, tamano_lote=TAMANO_LOTE_IMPORTACION, ruta_rechazados=None):
+    """
+    Importa productos desde un archivo CSV o JSONL en una única transacción.
+    El archivo se lee en streaming y se inserta con executemany en lotes de 'tamano_lote'.
+    Las filas inválidas no detienen la carga: se cuentan y, si se indica 'ruta_rechazados',
+    se escriben allí en formato JSONL junto con la línea y el motivo.
+    Retorna un diccionario con el resumen, o None si la transacción falló (no se inserta nada).
+    """
+    if formato is None:
+        formato = 'csv' if ruta.lower().endswith('.csv') else 'jsonl'
+    if formato not in ('csv', 'jsonl'):
+        raise ValueError(f"Formato de importación no soportado: {formato}")
+
+    resultado = {'leidos': 0, 'insertados': 0, 'rechazados': 0, 'muestra_rechazos': []}
+    inicio = time.perf_counter()
+    rechazados = open(ruta_rechazados, 'w', encoding='utf-8') if ruta_rechazados else None
+    try:
+        with open(ruta, newline='', encoding='utf-8-sig') as archivo, transaccion() as conn:
+            # Una sola versión para toda la importación: se confirma en una transacción
+            _siguiente_version(conn)
+            lote = []
+            for numero, fila in _leer_filas_archivo(archivo, formato):
+                resultado['leidos'] += 1
+                try:
+                    if isinstance(fila, ValueError):
+                        raise fila
+                    lote.append(validar_producto(
+                        fila.get('nombre'), fila.get('descripcion'), fila.get('cantidad'),
+                        fila.get('precio'), fila.get('categoria'),
+                    ))
+                except ValueError as e:
+                    resultado['rechazados'] += 1
+                    rechazo = {'linea': numero, 'motivo': str(e)}
+                    if len(resultado['muestra_rechazos']) < MAX_MUESTRA_RECHAZOS:
+                        resultado['muestra_rechazos'].append(rechazo)
+                    if rechazados:
+                        detalle = dict(rechazo, fila=fila if isinstance(fila, dict) else None)
+                        rechazados.write(json.dumps(detalle, ensure_ascii=False) + '\n')
+                    continue
+
+                if len(lote) >= tamano_lote:
+                    conn.executemany(_SQL_INSERTAR_PRODUCTO, lote)
+                    resultado['insertados'] += len(lote)
+                    lote.clear()
+
+            if lote:
+                conn.executemany(_SQL_INSERTAR_PRODUCTO, lote)
+                resultado['insertados'] += len(lote)
+            if _cache is not None:
+                _al_confirmar(base_actual(), _cache.limpiar)
+    except sqlite3.Error as e:
+        print(f"Error de BD al importar: {e}")
+        return None
+    finally:
+        if rechazados:
+            rechazados.close()
+
+    segundos = time.perf_counter() - inicio
+    resultado['segundos'] = segundos
+    resultado['filas_por_segundo'] = resultado['insertados'] / segundos if segundos > 0 else 0.0
+    return resultado
+
+# --- Respaldos ---
+
+DIRECTORIO_RESPALDOS = 'respaldos'
+# Páginas copiadas por paso del respaldo: entre paso y paso la base queda libre
+PAGINAS_POR_PASO = 1024
+# Pausa (segundos) entre pasos para dar lugar a las demás conexiones
+PAUSA_ENTRE_PASOS = 0.005
+# Respaldos que se conservan; los más antiguos se borran al crear uno nuevo
+RETENCION_RESPALDOS = 10
+# Si otra conexión escribe durante la copia, SQLite reinicia el respaldo; tras estos
+# reinicios se copia en un solo paso (con WAL, la lectura no bloquea a los escritores)
+MAX_REINICIOS_RESPALDO = 3
+
+class _RespaldoReiniciado(Exception):
+    """La copia por pasos se reinició demasiadas veces por escrituras concurrentes."""
+
+def _nombre_respaldo(ruta):
+    base = os.path.splitext(os.path.basename(ruta))[0]
+    return f"{base}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.db"
+
+def _verificar_integridad(conn):
+    """Retorna 'ok' o el primer problema informado por PRAGMA integrity_check."""
+    return conn.execute("PRAGMA integrity_check").fetchone()[0]
+
+def listar_respaldos(directorio=None):
+    """Retorna los respaldos de la base actual, del más reciente al más antiguo: [{'ruta', 'fecha', 'bytes'}]."""
+    directorio = directorio or DIRECTORIO_RESPALDOS
+    base = os.path.splitext(os.path.basename(base_actual()))[0]
+    patron = re.compile(re.escape(base) + r'-(\d{8}-\d{6})-\d{6}\.db$')
+    respaldos = []
+    if not os.path.isdir(directorio):
+        return respaldos
+    for nombre in sorted(os.listdir(directorio), reverse=True):
+        coincidencia = patron.match(nombre)
+        if coincidencia:
+            ruta = os.path.join(directorio, nombre)
+            respaldos.append({
+                'ruta': ruta,
+                'fecha': datetime.strptime(coincidencia.group(1), '%Y%m%d-%H%M%S').isoformat(sep=' '),
+                'bytes': os.path.getsize(ruta),
+            })
+    return respaldos
+
+def _rotar_respaldos(directorio, retencion):
+    borrados = 0
+    for respaldo in listar_respaldos(directorio)[retencion:]:
+        os.remove(respaldo['ruta'])
+        borrados += 1
+    return borrados
+
+@_instrumentada(fallo=None)
+def crear_respaldo(directorio=None, paginas_por_paso=PAGINAS_POR_PASO,
+                   pausa=PAUSA_ENTRE_PASOS, retencion=RETENCION_RESPALDOS, progreso=None):
+    """
+    Copia la base en uso a 'directorio' con la API de respaldo de SQLite, de a
+    'paginas_por_paso' páginas: lectores y escritores siguen trabajando durante la copia
+    y nunca quedan bloqueados más que un paso. 'progreso(copiadas, total)' se llama tras
+    cada paso. El respaldo se verifica con integrity_check antes de darle su nombre
+    definitivo y luego se borran los más antiguos según 'retencion' (None = conservar todos).
+    Retorna un diccionario con ruta, bytes, paginas, pasos, reinicios, borrados y segundos,
+    o None si falló.
+    """
+    directorio = directorio or DIRECTORIO_RESPALDOS
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, _nombre_respaldo(base_actual()))
+    temporal = ruta + '.tmp'
+    estado = {'pasos': 0, 'reinicios': 0, 'restantes': None, 'total': 0}
+
+    def paso(_, restantes, total):
+        # Si quedan más páginas que en el paso anterior, otra conexión escribió y SQLite reinició
+        if estado['restantes'] is not None and restantes > estado['restantes']:
+            estado['reinicios'] += 1
+        estado.update(pasos=estado['pasos'] + 1, restantes=restantes, total=total)
+        if progreso:
+            progreso(total - restantes, total)
+        if estado['reinicios'] > MAX_REINICIOS_RESPALDO:
+            raise _RespaldoReiniciado()
+
+    inicio = time.perf_counter()
+    origen = get_db_connection()
+    destino = sqlite3.connect(temporal)
+    try:
+        try:
+            origen.backup(destino, pages=paginas_por_paso, progress=paso, sleep=pausa)
+        except _RespaldoReiniciado:
+            origen.backup(destino, pages=-1)
+            estado['pasos'] += 1
+            estado['total'] = destino.execute("PRAGMA page_count").fetchone()[0]
+            if progreso:
+                progreso(estado['total'], estado['total'])
+        # El respaldo queda como un único archivo, sin -wal ni -shm
+        destino.execute("PRAGMA journal_mode = DELETE")
+        integridad = _verificar_integridad(destino)
+        if integridad != 'ok':
+            raise sqlite3.DatabaseError(f"El respaldo no pasó la verificación de integridad: {integridad}")
+    except sqlite3.Error as e:
+        destino.close()
+        os.remove(temporal)
+        print(f"Error de BD al crear el respaldo: {e}")
+        return None
     finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+        origen.close()
+    destino.close()
+    os.replace(temporal, ruta)
+
+    return {
+        'ruta': ruta,
+        'bytes': os.path.getsize(ruta),
+        'paginas': estado['total'],
+        'pasos': estado['pasos'],
+        'reinicios': estado['reinicios'],
+        'borrados': _rotar_respaldos(directorio, retencion) if retencion is not None else 0,
+        'segundos': time.perf_counter() - inicio,
+    }
+
+@_instrumentada(fallo=None)
+def restaurar_respaldo(ruta_respaldo, respaldar_antes=True, directorio=None):
+    """
+    Reemplaza el contenido de la base en uso por el de 'ruta_respaldo', que primero se
+    verifica con integrity_check. Con 'respaldar_antes', el estado actual se respalda antes
+    de sobrescribirlo. La copia toma el bloqueo de escritura durante la restauración; las
+    conexiones abiertas ven el contenido restaurado y la caché se vacía. Si el respaldo
+    tiene un esquema anterior, se le aplican las migraciones pendientes.
+    Las instantáneas de analitica.py deben volver a cargarse tras restaurar.
+    Retorna un diccionario con ruta, respaldo_previo y segundos, o None si falló.
+    """
+    if not os.path.isfile(ruta_respaldo):
+        print(f"Error: no existe el respaldo '{ruta_respaldo}'.")
+        return None
+    inicio = time.perf_counter()
+    try:
+        origen = sqlite3.connect(f"file:{ruta_respaldo}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        print(f"Error de BD al abrir el respaldo: {e}")
+        return None
+    try:
+        integridad = _verificar_integridad(origen)
+        if integridad != 'ok':
+            print(f"Error: el respaldo está dañado ({integridad}); no se restauró.")
+            return None
+        previo = None
+        if respaldar_antes:
+            previo = crear_respaldo(directorio, retencion=None)
+            if previo is None:
+                print("Error: no se pudo respaldar el estado actual; no se restauró.")
+                return None
+        # La copia toma el bloqueo de escritura: las demás escrituras esperan a que termine
+        with conexion() as destino:
+            origen.backup(destino)
+    except sqlite3.Error as e:
+        print(f"Error de BD al restaurar el respaldo: {e}")
+        return None
+    finally:
+        origen.close()
+
+    if _cache is not None:
+        _cache.limpiar()
+    setup_database()
+    return {
+        'ruta': ruta_respaldo,
+        'respaldo_previo': previo['ruta'] if previo else None,
+        'segundos': time.perf_counter() - inicio,
+    }
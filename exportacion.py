@@ -0,0 +1,333 @@
+"""
+Exportación del inventario en streaming.
+
+Lee 'productos' con fetchmany en bloques de tamaño fijo y los escribe en CSV, JSONL o en
+un formato binario columnar compacto, con filtros opcionales y compresión gzip. Solo un
+bloque vive en memoria a la vez, así que el consumo es constante sin importar el tamaño
+de la tabla. El archivo se escribe con un nombre temporal y se renombra al terminar: una
+exportación interrumpida nunca deja un archivo final a medias.
+
+Formato columnar ('col'), todos los enteros en little-endian:
+    cabecera  b'INVCOL1\\n' + uint32 largo + JSON {"columnas": [[nombre, tipo], ...]}
+    bloque    uint32 filas (0 = fin del archivo) y luego cada columna según su tipo:
+        'i64'   filas * int64
+        'f64'   filas * float64
+        'texto' filas * int32 largos en bytes (-1 = NULL) + uint32 total + UTF-8
+        'dicc'  uint32 valores nuevos + esos valores codificados como 'texto' +
+                filas * int32 códigos (-1 = NULL). El diccionario se acumula entre bloques.
+
+Uso:
+    python exportacion.py inventario.csv
+    python exportacion.py inventario.jsonl.gz --categoria Oficina
+    python exportacion.py inventario.col --stock-maximo 10 --bloque 20000
+    python main.py exportar inventario.csv.gz
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import struct
+import sys
+import time
+from array import array
+
+import database_manager as db
+
+# Filas por cada fetchmany (y por cada bloque del formato columnar)
+TAMANO_BLOQUE = 10000
+# gzip nivel 1: la mayor parte de la reducción de tamaño con una fracción del costo de CPU
+NIVEL_COMPRESION = 1
+
+FORMATOS = ('csv', 'jsonl', 'col')
+
+# Columnas exportadas y su tipo en el formato columnar
+COLUMNAS = (
+    ('id', 'i64'),
+    ('nombre', 'texto'),
+    ('descripcion', 'texto'),
+    ('cantidad', 'i64'),
+    ('precio', 'f64'),
+    ('categoria', 'dicc'),
+    ('punto_reorden', 'i64'),
+)
+NOMBRES_COLUMNAS = tuple(nombre for nombre, _ in COLUMNAS)
+
+MAGICO_COLUMNAR = b'INVCOL1\n'
+_ENTERO = struct.Struct('<I')
+_INVERTIR_BYTES = sys.byteorder == 'big'
+
+
+def _consulta(categoria=None, stock_maximo=None, bajo_reorden=False):
+    """Arma el SELECT con los filtros pedidos; cada filtro puede resolverse con un índice."""
+    condiciones, parametros = [], []
+    if categoria is not None:
+        condiciones.append("categoria = ?")
+        parametros.append(categoria)
+    if stock_maximo is not None:
+        condiciones.append("cantidad <= ?")
+        parametros.append(stock_maximo)
+    if bajo_reorden:
+        condiciones.append("cantidad <= punto_reorden")
+    sql = f"SELECT {', '.join(NOMBRES_COLUMNAS)} FROM productos"
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    return sql, parametros
+
+def _formato_de_ruta(ruta):
+    """Deduce formato y compresión de la extensión (.csv, .jsonl, .col, con .gz opcional)."""
+    nombre = ruta.lower()
+    comprimir = nombre.endswith('.gz')
+    if comprimir:
+        nombre = nombre[:-3]
+    for formato in FORMATOS:
+        if nombre.endswith('.' + formato):
+            return formato, comprimir
+    return 'csv', comprimir
+
+def _abrir(ruta, binario, comprimir):
+    if comprimir and binario:
+        return gzip.open(ruta, 'wb', compresslevel=NIVEL_COMPRESION)
+    if comprimir:
+        return gzip.open(ruta, 'wt', compresslevel=NIVEL_COMPRESION, encoding='utf-8', newline='')
+    if binario:
+        return open(ruta, 'wb')
+    return open(ruta, 'w', encoding='utf-8', newline='')
+
+# --- Escritores por formato ---
+
+class _EscritorCSV:
+    def __init__(self, archivo):
+        self._escritor = csv.writer(archivo)
+        self._escritor.writerow(NOMBRES_COLUMNAS)
+
+    def escribir(self, filas):
+        self._escritor.writerows(filas)
+
+    def finalizar(self):
+        pass
+
+class _EscritorJSONL:
+    def __init__(self, archivo):
+        self._archivo = archivo
+
+    def escribir(self, filas):
+        self._archivo.write(''.join(
+            json.dumps(dict(zip(NOMBRES_COLUMNAS, fila)), ensure_ascii=False) + '\n' for fila in filas
+        ))
+
+    def finalizar(self):
+        pass
+
+class _EscritorColumnar:
+    def __init__(self, archivo):
+        self._archivo = archivo
+        self._diccionarios = {nombre: {} for nombre, tipo in COLUMNAS if tipo == 'dicc'}
+        cabecera = json.dumps({'columnas': [list(c) for c in COLUMNAS]}).encode('utf-8')
+        archivo.write(MAGICO_COLUMNAR + _ENTERO.pack(len(cabecera)) + cabecera)
+
+    def escribir(self, filas):
+        partes = [_ENTERO.pack(len(filas))]
+        for posicion, (nombre, tipo) in enumerate(COLUMNAS):
+            valores = [fila[posicion] for fila in filas]
+            if tipo == 'i64':
+                partes.append(_arreglo('q', valores))
+            elif tipo == 'f64':
+                partes.append(_arreglo('d', valores))
+            elif tipo == 'texto':
+                partes.append(_codificar_textos(valores))
+            else:
+                diccionario = self._diccionarios[nombre]
+                nuevos = []
+                codigos = array('i')
+                for valor in valores:
+                    if valor is None:
+                        codigos.append(-1)
+                        continue
+                    codigo = diccionario.get(valor)
+                    if codigo is None:
+                        codigo = diccionario[valor] = len(diccionario)
+                        nuevos.append(valor)
+                    codigos.append(codigo)
+                partes.append(_ENTERO.pack(len(nuevos)))
+                partes.append(_codificar_textos(nuevos))
+                partes.append(_a_bytes(codigos))
+        self._archivo.write(b''.join(partes))
+
+    def finalizar(self):
+        self._archivo.write(_ENTERO.pack(0))
+
+_ESCRITORES = {'csv': _EscritorCSV, 'jsonl': _EscritorJSONL, 'col': _EscritorColumnar}
+
+def _a_bytes(arreglo):
+    if _INVERTIR_BYTES:
+        arreglo.byteswap()
+    return arreglo.tobytes()
+
+def _arreglo(codigo, valores):
+    return _a_bytes(array(codigo, valores))
+
+def _codificar_textos(valores):
+    codificados = [v.encode('utf-8') if v is not None else None for v in valores]
+    largos = array('i', (len(c) if c is not None else -1 for c in codificados))
+    datos = b''.join(c for c in codificados if c)
+    return _a_bytes(largos) + _ENTERO.pack(len(datos)) + datos
+
+# --- Exportación ---
+
+def exportar_productos(ruta, formato=None, comprimir=None, categoria=None, stock_maximo=None,
+                       bajo_reorden=False, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Exporta los productos que cumplen los filtros a 'ruta' en formato 'csv', 'jsonl' o 'col'.
+    Formato y compresión se deducen de la extensión si no se indican.
+    Filtros: 'categoria' exacta, 'stock_maximo' (cantidad <= valor) y 'bajo_reorden'
+    (cantidad <= punto de reorden). La lectura es una sola consulta, así que el archivo
+    refleja una instantánea consistente aunque haya escrituras concurrentes.
+    Retorna un diccionario con filas, bloques, bytes, segundos y filas_por_segundo,
+    o None si falló la base de datos (no queda ningún archivo en 'ruta').
+    """
+    formato_ruta, comprimir_ruta = _formato_de_ruta(ruta)
+    formato = formato or formato_ruta
+    comprimir = comprimir_ruta if comprimir is None else comprimir
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+    if tamano_bloque <= 0:
+        raise ValueError("El tamaño de bloque debe ser un número entero positivo.")
+
+    sql, parametros = _consulta(categoria, stock_maximo, bajo_reorden)
+    resultado = {'filas': 0, 'bloques': 0}
+    inicio = time.perf_counter()
+    temporal = ruta + '.tmp'
+    try:
+        with _abrir(temporal, formato == 'col', comprimir) as archivo, db.conexion() as conn:
+            escritor = _ESCRITORES[formato](archivo)
+            cursor = conn.cursor()
+            # Tuplas en lugar de sqlite3.Row: la exportación solo necesita los valores en orden
+            cursor.row_factory = None
+            cursor.execute(sql, parametros)
+            while True:
+                filas = cursor.fetchmany(tamano_bloque)
+                if not filas:
+                    break
+                escritor.escribir(filas)
+                resultado['filas'] += len(filas)
+                resultado['bloques'] += 1
+            escritor.finalizar()
+        os.replace(temporal, ruta)
+    except sqlite3.Error as e:
+        print(f"Error de BD al exportar: {e}")
+        return None
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+    segundos = time.perf_counter() - inicio
+    resultado['ruta'] = ruta
+    resultado['formato'] = formato + ('.gz' if comprimir else '')
+    resultado['bytes'] = os.path.getsize(ruta)
+    resultado['segundos'] = segundos
+    resultado['filas_por_segundo'] = resultado['filas'] / segundos if segundos > 0 else 0.0
+    return resultado
+
+# --- Lectura del formato columnar ---
+
+def leer_columnar(ruta):
+    """
+    Genera los bloques de un archivo columnar (comprimido o no) como diccionarios
+    {columna: valores}: array('q')/array('d') para las numéricas y listas para los textos.
+    """
+    with open(ruta, 'rb') as prueba:
+        comprimido = prueba.read(2) == b'\x1f\x8b'
+    with (gzip.open(ruta, 'rb') if comprimido else open(ruta, 'rb')) as archivo:
+        if archivo.read(len(MAGICO_COLUMNAR)) != MAGICO_COLUMNAR:
+            raise ValueError(f"{ruta} no es un archivo de exportación columnar.")
+        largo, = _ENTERO.unpack(archivo.read(4))
+        columnas = json.loads(archivo.read(largo))['columnas']
+        diccionarios = {nombre: [] for nombre, tipo in columnas if tipo == 'dicc'}
+        while True:
+            filas, = _ENTERO.unpack(archivo.read(4))
+            if filas == 0:
+                return
+            bloque = {}
+            for nombre, tipo in columnas:
+                if tipo in ('i64', 'f64'):
+                    bloque[nombre] = _leer_arreglo(archivo, 'q' if tipo == 'i64' else 'd', filas)
+                elif tipo == 'texto':
+                    bloque[nombre] = _leer_textos(archivo, filas)
+                else:
+                    nuevos, = _ENTERO.unpack(archivo.read(4))
+                    valores = diccionarios[nombre]
+                    valores.extend(_leer_textos(archivo, nuevos))
+                    codigos = _leer_arreglo(archivo, 'i', filas)
+                    bloque[nombre] = [valores[c] if c >= 0 else None for c in codigos]
+            yield bloque
+
+def _leer_arreglo(archivo, codigo, cantidad):
+    arreglo = array(codigo)
+    arreglo.frombytes(archivo.read(arreglo.itemsize * cantidad))
+    if _INVERTIR_BYTES:
+        arreglo.byteswap()
+    return arreglo
+
+def _leer_textos(archivo, cantidad):
+    largos = _leer_arreglo(archivo, 'i', cantidad)
+    total, = _ENTERO.unpack(archivo.read(4))
+    datos = archivo.read(total)
+    textos, posicion = [], 0
+    for largo in largos:
+        if largo < 0:
+            textos.append(None)
+            continue
+        textos.append(datos[posicion:posicion + largo].decode('utf-8'))
+        posicion += largo
+    return textos
+
+# --- Línea de comandos ---
+
+def mostrar_resumen(resultado, salida=sys.stdout):
+    """Imprime el resumen (filas, tamaño y rendimiento) de una exportación."""
+    print(f"Archivo:          {resultado['ruta']} ({resultado['formato']})", file=salida)
+    print(f"Filas:            {resultado['filas']} en {resultado['bloques']} bloques", file=salida)
+    print(f"Tamaño:           {resultado['bytes'] / 1_048_576:,.1f} MiB", file=salida)
+    print(f"Tiempo:           {resultado['segundos']:.2f} s", file=salida)
+    print(f"Rendimiento:      {resultado['filas_por_segundo']:,.0f} filas/s", file=salida)
+
+def agregar_argumentos(parser):
+    """Opciones de exportación compartidas por este módulo y el subcomando de main.py."""
+    parser.add_argument('archivo', help="Destino; la extensión (.csv, .jsonl, .col y .gz) define el formato")
+    parser.add_argument('--formato', choices=FORMATOS, help="Por defecto se deduce de la extensión")
+    parser.add_argument('--gzip', action='store_true', default=None, help="Comprime con gzip")
+    parser.add_argument('--categoria', help="Exporta solo esta categoría")
+    parser.add_argument('--stock-maximo', type=int, help="Exporta solo productos con cantidad <= valor")
+    parser.add_argument('--bajo-reorden', action='store_true', help="Exporta solo productos por reponer")
+    parser.add_argument('--bloque', type=int, default=TAMANO_BLOQUE, help="Filas por bloque de lectura")
+
+def ejecutar(args):
+    """Ejecuta una exportación a partir de los argumentos ya parseados. Retorna el código de salida."""
+    try:
+        resultado = exportar_productos(
+            args.archivo, args.formato, args.gzip, args.categoria,
+            args.stock_maximo, args.bajo_reorden, args.bloque,
+        )
+    except (OSError, ValueError) as e:
+        print(f"No se pudo exportar: {e}", file=sys.stderr)
+        return 1
+    if resultado is None:
+        return 1
+    mostrar_resumen(resultado)
+    return 0
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Exporta el inventario a CSV, JSONL o formato columnar")
+    agregar_argumentos(parser)
+    args = parser.parse_args(argumentos)
+    db.setup_database()
+    try:
+        return ejecutar(args)
+    finally:
+        db.cerrar_conexiones()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+Modo no interactivo (por lotes) del sistema de inventario.
+
+Lee comandos JSON, uno por línea, desde un archivo o la entrada estándar, los ejecuta
+contra database_manager agrupados en transacciones y escribe un resultado JSON por
+comando en la salida estándar. No limpia la pantalla ni usa colorama: el rendimiento
+queda limitado por la base de datos, no por la interfaz.
+
+Comandos admitidos (campo "op"):
+    {"op": "registrar", "nombre": "Mouse", "descripcion": "", "cantidad": 5, "precio": 9.9, "categoria": "Periféricos"}
+    {"op": "actualizar", "id": 7, "cantidad": 12}        # los campos omitidos conservan su valor
+    {"op": "eliminar", "id": 7}
+    {"op": "buscar", "criterio": "nombre", "valor": "mou", "limite": 10}
+    {"op": "reporte", "limite": 5}                         # sin "limite": punto de reorden de cada producto
+    {"op": "cambios_reorden", "desde": 0}                  # productos que cruzaron su punto de reorden
+    {"op": "movimiento", "id": 7, "delta": -2, "motivo": "venta", "referencia": "F-0001"}
+    {"op": "respaldo", "directorio": "respaldos"}        # copia del estado confirmado hasta el grupo anterior
+
+Uso:
+    python lote.py comandos.jsonl
+    cat comandos.jsonl | python lote.py --grupo 500
+    python main.py lote comandos.jsonl
+"""
+import argparse
+import json
+import sys
+import time
+from contextlib import redirect_stdout
+
+import database_manager as db
+
+# Comandos por transacción: un commit (y un fsync) por grupo en lugar de uno por comando
+TAMANO_GRUPO = 1000
+
+CAMPOS_PRODUCTO = ('nombre', 'descripcion', 'cantidad', 'precio', 'categoria')
+
+
+class ErrorComando(Exception):
+    """Comando mal formado o inválido; se informa en su resultado sin detener el lote."""
+
+
+def _registrar(comando):
+    datos = db.validar_producto(*(comando.get(campo) for campo in CAMPOS_PRODUCTO))
+    if not db.registrar_producto(*datos, _punto_reorden(comando)):
+        raise ErrorComando("No se pudo registrar el producto.")
+    with db.conexion() as conn:
+        # Misma conexión y transacción que el INSERT: es el ID recién asignado
+        return {'id': conn.execute("SELECT last_insert_rowid()").fetchone()[0]}
+
+def _actualizar(comando):
+    id_producto = _id_del_comando(comando)
+    actuales = db.buscar_producto('id', id_producto)
+    if not actuales:
+        raise ErrorComando(f"No se encontró ningún producto con ID {id_producto}.")
+    actual = actuales[0]
+    datos = db.validar_producto(*(comando.get(campo, actual[campo]) for campo in CAMPOS_PRODUCTO))
+    if not db.actualizar_producto(id_producto, *datos, _punto_reorden(comando)):
+        raise ErrorComando(f"No se pudo actualizar el producto con ID {id_producto}.")
+    return {'id': id_producto}
+
+def _eliminar(comando):
+    id_producto = _id_del_comando(comando)
+    if not db.eliminar_producto(id_producto):
+        raise ErrorComando(f"No se encontró o no se pudo eliminar el producto con ID {id_producto}.")
+    return {'id': id_producto}
+
+def _buscar(comando):
+    criterio = comando.get('criterio')
+    if criterio not in ('id', 'nombre', 'categoria', 'texto') or comando.get('valor') in (None, ''):
+        raise ErrorComando("Criterio o valor de búsqueda no válidos.")
+    productos = db.buscar_producto(criterio, comando['valor'], comando.get('limite'))
+    return {'productos': [dict(p) for p in productos]}
+
+def _reporte(comando):
+    if 'limite' not in comando:
+        return {'productos': [dict(p) for p in db.reporte_reorden()]}
+    limite = comando['limite']
+    if not isinstance(limite, int) or limite < 0:
+        raise ErrorComando("El límite debe ser un número entero positivo.")
+    return {'productos': [dict(p) for p in db.reporte_bajo_stock(limite)]}
+
+def _movimiento(comando):
+    resultado = db.registrar_movimientos([{
+        'id': _id_del_comando(comando), 'delta': comando.get('delta'),
+        'motivo': comando.get('motivo'), 'referencia': comando.get('referencia'),
+    }])
+    if not resultado or not resultado[0]['ok']:
+        raise ErrorComando(resultado[0]['error'] if resultado else "No se pudo registrar el movimiento.")
+    return {'id': resultado[0]['id'], 'cantidad': resultado[0]['cantidad']}
+
+def _cambios_reorden(comando):
+    desde = comando.get('desde', 0)
+    if not isinstance(desde, int) or desde < 0:
+        raise ErrorComando("El cursor 'desde' debe ser un número entero positivo.")
+    eventos, cursor = db.cambios_bajo_stock(desde, comando.get('limite', 1000))
+    return {'eventos': [dict(e) for e in eventos], 'cursor': cursor}
+
+def _respaldo(comando):
+    # La copia usa su propia conexión: incluye lo confirmado, no el grupo en curso
+    resultado = db.crear_respaldo(comando.get('directorio'))
+    if resultado is None:
+        raise ErrorComando("No se pudo crear el respaldo.")
+    return resultado
+
+def _punto_reorden(comando):
+    punto_reorden = comando.get('punto_reorden')
+    if punto_reorden is not None and (not isinstance(punto_reorden, int) or punto_reorden < 0):
+        raise ErrorComando("El punto de reorden debe ser un número entero positivo.")
+    return punto_reorden
+
+def _id_del_comando(comando):
+    try:
+        return int(comando['id'])
+    except (KeyError, TypeError, ValueError):
+        raise ErrorComando("El ID debe ser un número entero.") from None
+
+COMANDOS = {
+    'registrar': _registrar,
+    'actualizar': _actualizar,
+    'eliminar': _eliminar,
+    'buscar': _buscar,
+    'reporte': _reporte,
+    'movimiento': _movimiento,
+    'cambios_reorden': _cambios_reorden,
+    'respaldo': _respaldo,
+}
+
+def ejecutar_comando(comando):
+    """Ejecuta un comando (diccionario) y retorna su resultado como diccionario."""
+    if not isinstance(comando, dict):
+        raise ErrorComando("Cada línea debe ser un objeto JSON.")
+    op = comando.get('op')
+    operacion = COMANDOS.get(op) if isinstance(op, str) else None
+    if operacion is None:
+        raise ErrorComando(f"Operación desconocida: {comando.get('op')!r}.")
+    return operacion(comando)
+
+def ejecutar_lote(entrada, salida, tamano_grupo=TAMANO_GRUPO):
+    """
+    Ejecuta los comandos de 'entrada' (líneas JSON) en transacciones de 'tamano_grupo'
+    comandos y escribe un resultado JSON por línea en 'salida'. Cada comando corre en su
+    propio SAVEPOINT: si falla, se deshace solo lo que él escribió y el resto del grupo
+    sigue. Los resultados de cada grupo se escriben después de su commit; si el grupo
+    entero se revierte, todos sus comandos se informan como fallidos.
+    Retorna un resumen con totales y rendimiento.
+    """
+    resumen = {'comandos': 0, 'ok': 0, 'errores': 0}
+    inicio = time.perf_counter()
+    lineas = (
+        (numero, linea) for numero, linea in enumerate(entrada, start=1) if linea.strip()
+    )
+    agotado = False
+    while not agotado:
+        resultados = []
+        try:
+            with db.transaccion() as conn:
+                for numero, linea in lineas:
+                    resultado = {'linea': numero}
+                    conn.execute("SAVEPOINT comando")
+                    try:
+                        comando = json.loads(linea)
+                        resultado['op'] = comando.get('op') if isinstance(comando, dict) else None
+                        resultado.update(ejecutar_comando(comando), ok=True)
+                    except json.JSONDecodeError as e:
+                        resultado.update(ok=False, error=f"JSON inválido: {e.msg}")
+                    except (ErrorComando, ValueError) as e:
+                        resultado.update(ok=False, error=str(e))
+                    except Exception as e:
+                        resultado.update(ok=False, error=f"Error inesperado: {e}")
+                    resultados.append(resultado)
+                    if not resultado['ok']:
+                        # Las funciones que fallan a mitad de camino pueden haber escrito algo
+                        conn.execute("ROLLBACK TO comando")
+                    conn.execute("RELEASE comando")
+                    if len(resultados) >= tamano_grupo:
+                        break
+                else:
+                    agotado = True
+        except Exception as e:
+            for resultado in resultados:
+                resultado.update(ok=False, error=f"Transacción revertida: {e}")
+
+        for resultado in resultados:
+            resumen['comandos'] += 1
+            resumen['ok' if resultado['ok'] else 'errores'] += 1
+            salida.write(json.dumps(resultado, ensure_ascii=False, default=str) + '\n')
+        salida.flush()
+
+    resumen['segundos'] = time.perf_counter() - inicio
+    resumen['comandos_por_segundo'] = (
+        resumen['comandos'] / resumen['segundos'] if resumen['segundos'] > 0 else 0.0
+    )
+    return resumen
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Ejecuta comandos de inventario en lote (JSONL)")
+    parser.add_argument('archivo', nargs='?', default='-', help="Archivo de comandos ('-' = entrada estándar)")
+    parser.add_argument('--grupo', type=int, default=TAMANO_GRUPO, help="Comandos por transacción")
+    args = parser.parse_args(argumentos)
+    return ejecutar_desde_archivo(args.archivo, args.grupo)
+
+def ejecutar_desde_archivo(archivo, tamano_grupo=TAMANO_GRUPO):
+    """Ejecuta un archivo de comandos ('-' para stdin). Retorna el código de salida del proceso."""
+    salida = sys.stdout
+    # Los mensajes de error que imprime database_manager van a stderr para no mezclarse con el JSON
+    with redirect_stdout(sys.stderr):
+        db.setup_database()
+        try:
+            # Una línea con bytes que no son UTF-8 se informa como JSON inválido, no corta el grupo
+            if archivo == '-':
+                sys.stdin.reconfigure(errors='replace')
+                resumen = ejecutar_lote(sys.stdin, salida, tamano_grupo)
+            else:
+                with open(archivo, encoding='utf-8', errors='replace') as entrada:
+                    resumen = ejecutar_lote(entrada, salida, tamano_grupo)
+        finally:
+            db.cerrar_conexiones()
+    print(json.dumps({'resumen': resumen}, ensure_ascii=False), file=sys.stderr)
+    return 0 if resumen['errores'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,14 @@
 import database_manager as db
+import lote
+import exportacion
+import tabla
 import os # Para limpiar la consola (cls/clear)
-from colorama import Fore, Style, init # Opcional: para colores en la terminal 
+import sys
+import argparse
 
-# Inicializa colorama (solo necesario si se usa)
+# colorama es opcional: sin ella la interfaz funciona sin colores
 try:
-    init(autoreset=True)
+    from colorama import Fore, Style, init # Opcional: para colores en la terminal 
     USE_COLORAMA = True
 except ImportError:
     USE_COLORAMA = False
@@ -15,45 +19,29 @@ def clear_screen():
     """Limpia la consola."""
     os.system('cls' if os.name == 'nt' else 'clear')
 
-def print_table(productos):
-    """Imprime la lista de productos en formato de tabla legible."""
-    if not productos:
-        print(Fore.YELLOW + "\n[!] No se encontraron productos." if USE_COLORAMA else "\n[!] No se encontraron productos.")
-        return
+# Columnas de la tabla de productos: el ancho real sale de los datos, hasta el máximo indicado
+COLUMNAS_PRODUCTOS = (
+    tabla.Columna('id', 'ID', 10, '>', 'd'),
+    tabla.Columna('nombre', 'NOMBRE', 30),
+    tabla.Columna('descripcion', 'DESCRIPCIÓN', 40),
+    tabla.Columna('cantidad', 'CANT.', 10, '>', 'd'),
+    tabla.Columna('precio', 'PRECIO', 12, '>', ',.2f'),
+    tabla.Columna('categoria', 'CATEGORÍA', 20),
+)
 
-    # Definición de anchos de columna para formato fijo
-    ID_W, NOMBRE_W, DESCRIPCION_W, CANTIDAD_W, PRECIO_W, CATEGORIA_W = 4, 20, 30, 10, 8, 15
-
-    # Cabecera de la tabla
-    header = (
-        f"{'ID':<{ID_W}} | "
-        f"{'NOMBRE':<{NOMBRE_W}} | "
-        f"{'DESCRIPCIÓN':<{DESCRIPCION_W}} | "
-        f"{'CANT.':<{CANTIDAD_W}} | "
-        f"{'PRECIO':<{PRECIO_W}} | "
-        f"{'CATEGORÍA':<{CATEGORIA_W}}"
-    )
-    
-    separator = "-" * len(header)
-    
-    print("\n" + Fore.CYAN + separator if USE_COLORAMA else "\n" + separator)
-    print(Fore.CYAN + header if USE_COLORAMA else header)
-    print(Fore.CYAN + separator if USE_COLORAMA else separator)
-
-    # Cuerpo de la tabla
-    for p in productos:
-        # Los objetos Row de SQLite permiten acceder por nombre de columna
-        row = (
-            f"{p['id']:<{ID_W}} | "
-            f"{p['nombre'][:NOMBRE_W]:<{NOMBRE_W}} | "
-            f"{p['descripcion'][:DESCRIPCION_W]:<{DESCRIPCION_W}} | "
-            f"{p['cantidad']:<{CANTIDAD_W}} | "
-            f"{p['precio']:<{PRECIO_W}.2f} | " # Formatear precio a 2 decimales
-            f"{p['categoria'][:CATEGORIA_W]:<{CATEGORIA_W}}"
-        )
-        print(row)
-        
-    print(Fore.CYAN + separator + "\n" if USE_COLORAMA else separator + "\n")
+def color_tabla():
+    """Color de cabeceras y separadores de las tablas (vacío sin colorama)."""
+    return Fore.CYAN if USE_COLORAMA else ''
+
+def print_table(productos, paginar=None):
+    """
+    Imprime los productos (una lista o cualquier iterable) en formato de tabla legible.
+    Por defecto pagina cuando la salida es una terminal.
+    """
+    if paginar is None:
+        paginar = sys.stdout.isatty()
+    if not tabla.imprimir_tabla(productos, COLUMNAS_PRODUCTOS, color=color_tabla(), paginar=paginar):
+        print(Fore.YELLOW + "\n[!] No se encontraron productos." if USE_COLORAMA else "\n[!] No se encontraron productos.")
 
 # --- Funcionalidades Requeridas (Interfaz) ---
 
@@ -87,17 +75,47 @@ def menu_registrar_producto():
 
     categoria = input("Categoría (Opcional): ").strip()
 
-    # 4. Llamar a la función de la base de datos
-    if db.registrar_producto(nombre, descripcion, cantidad, precio, categoria):
+    # 4. Punto de reorden (INTEGER >= 0): con stock igual o inferior, el producto aparece en el reporte
+    try:
+        punto_reorden = int(input(f"Punto de reorden [{db.UMBRAL_BAJO_STOCK}]: ").strip() or db.UMBRAL_BAJO_STOCK)
+        if punto_reorden < 0: raise ValueError
+    except ValueError:
+        print(Fore.RED + "El punto de reorden debe ser un número entero positivo. Operación cancelada." if USE_COLORAMA else "El punto de reorden debe ser un número entero positivo. Operación cancelada.")
+        return
+
+    # 5. Llamar a la función de la base de datos
+    if db.registrar_producto(nombre, descripcion, cantidad, precio, categoria, punto_reorden):
         print(Fore.GREEN + f"✅ Producto '{nombre}' registrado con éxito." if USE_COLORAMA else f"✅ Producto '{nombre}' registrado con éxito.")
     else:
         print(Fore.RED + "❌ Error al registrar el producto." if USE_COLORAMA else "❌ Error al registrar el producto.")
 
 def menu_visualizar_productos():
-    """Muestra todos los productos registrados en una tabla."""
+    """Muestra el inventario página por página, con navegación siguiente/anterior."""
     print(Fore.YELLOW + "\n--- Inventario Completo ---" if USE_COLORAMA else "\n--- Inventario Completo ---")
-    productos = db.visualizar_productos() 
-    print_table(productos)
+    pagina = db.obtener_pagina(0, db.TAMANO_PAGINA)
+    numero_pagina = 1
+
+    while True:
+        print_table(pagina, paginar=False)
+        if not pagina:
+            return
+        print(f"Página {numero_pagina} (IDs {pagina[0]['id']} a {pagina[-1]['id']})")
+        accion = input("[S]iguiente, [A]nterior, [Q] volver: ").strip().lower()
+
+        if accion == 's':
+            siguiente = db.obtener_pagina(pagina[-1]['id'], db.TAMANO_PAGINA)
+            if siguiente:
+                pagina, numero_pagina = siguiente, numero_pagina + 1
+            else:
+                print(Fore.YELLOW + "No hay más productos." if USE_COLORAMA else "No hay más productos.")
+        elif accion == 'a':
+            anterior = db.obtener_pagina_anterior(pagina[0]['id'], db.TAMANO_PAGINA)
+            if anterior:
+                pagina, numero_pagina = anterior, numero_pagina - 1
+            else:
+                print(Fore.YELLOW + "Ya está en la primera página." if USE_COLORAMA else "Ya está en la primera página.")
+        elif accion in ('q', ''):
+            return
 
 def menu_actualizar_producto():
     """Permite al usuario actualizar los datos de un producto por ID."""
@@ -156,8 +174,20 @@ def menu_actualizar_producto():
             
     categoria = input(f"Categoría [{producto_actual['categoria']}]: ").strip() or producto_actual['categoria']
 
+    while True:
+        punto_str = input(f"Punto de reorden [{producto_actual['punto_reorden']}]: ").strip()
+        if not punto_str:
+            punto_reorden = producto_actual['punto_reorden']
+            break
+        try:
+            punto_reorden = int(punto_str)
+            if punto_reorden < 0: raise ValueError
+            break
+        except ValueError:
+            print(Fore.RED + "El punto de reorden debe ser un número entero positivo." if USE_COLORAMA else "El punto de reorden debe ser un número entero positivo.")
+
     # Llamar a la función de la base de datos
-    if db.actualizar_producto(id_producto, nombre, descripcion, cantidad, precio, categoria):
+    if db.actualizar_producto(id_producto, nombre, descripcion, cantidad, precio, categoria, punto_reorden):
         print(Fore.GREEN + f"✅ Producto con ID {id_producto} actualizado con éxito." if USE_COLORAMA else f"✅ Producto con ID {id_producto} actualizado con éxito.")
     else:
         print(Fore.RED + f"❌ Error al actualizar o no se encontró el producto con ID {id_producto}." if USE_COLORAMA else f"❌ Error al actualizar o no se encontró el producto con ID {id_producto}.")
@@ -189,14 +219,16 @@ def menu_buscar_producto():
     print("1. ID") 
     print("2. Nombre") 
     print("3. Categoría") 
+    print("4. Texto libre (nombre, descripción o categoría)")
     
-    opcion = input("Seleccione una opción de búsqueda (1-3): ").strip()
+    opcion = input("Seleccione una opción de búsqueda (1-4): ").strip()
     valor_busqueda = input("Ingrese el valor a buscar: ").strip()
     
     criterio_map = {
         '1': 'id',
         '2': 'nombre',
-        '3': 'categoria'
+        '3': 'categoria',
+        '4': 'texto'
     }
     
     criterio = criterio_map.get(opcion)
@@ -213,8 +245,16 @@ def menu_buscar_producto():
 def menu_reporte_stock():
     """Genera un reporte de productos con stock bajo."""
     print(Fore.YELLOW + "\n--- Reporte de Productos con Stock Bajo ---" if USE_COLORAMA else "\n--- Reporte de Productos con Stock Bajo ---")
+    limite_str = input("Mostrar productos con Cantidad igual o inferior a (Límite, ENTER = punto de reorden de cada producto): ").strip()
+
+    if not limite_str:
+        print(Fore.CYAN + "\n--- Productos en o por debajo de su Punto de Reorden ---" if USE_COLORAMA else "\n--- Productos en o por debajo de su Punto de Reorden ---")
+        # Se lee de a una página a medida que se muestra
+        print_table(db.iterar_reorden())
+        return
+
     try:
-        limite = int(input("Mostrar productos con Cantidad igual o inferior a (Límite): "))
+        limite = int(limite_str)
         if limite < 0: raise ValueError
     except ValueError:
         print(Fore.RED + "El límite debe ser un número entero positivo." if USE_COLORAMA else "El límite debe ser un número entero positivo.")
@@ -225,6 +265,218 @@ def menu_reporte_stock():
     print(Fore.CYAN + f"\n--- Productos con Stock <= {limite} ---" if USE_COLORAMA else f"\n--- Productos con Stock <= {limite} ---")
     print_table(productos)
 
+def mostrar_resumen_importacion(resultado):
+    """Imprime el resumen (totales, rechazos y rendimiento) de una importación masiva."""
+    print(f"Filas leídas:     {resultado['leidos']}")
+    print(f"Insertadas:       {resultado['insertados']}")
+    print(f"Rechazadas:       {resultado['rechazados']}")
+    print(f"Tiempo:           {resultado['segundos']:.2f} s")
+    print(f"Rendimiento:      {resultado['filas_por_segundo']:,.0f} filas/s")
+    for rechazo in resultado['muestra_rechazos']:
+        print(f"  Línea {rechazo['linea']}: {rechazo['motivo']}")
+    if resultado['rechazados'] > len(resultado['muestra_rechazos']):
+        print(f"  ... y {resultado['rechazados'] - len(resultado['muestra_rechazos'])} rechazos más.")
+
+def menu_importar_productos():
+    """Importa productos en bloque desde un archivo CSV o JSONL."""
+    print(Fore.YELLOW + "\n--- Importar Productos desde Archivo ---" if USE_COLORAMA else "\n--- Importar Productos desde Archivo ---")
+    print("Columnas esperadas: nombre, descripcion, cantidad, precio, categoria")
+    ruta = input("Ruta del archivo (.csv o .jsonl): ").strip()
+    if not ruta:
+        print(Fore.RED + "Debe indicar un archivo. Operación cancelada." if USE_COLORAMA else "Debe indicar un archivo. Operación cancelada.")
+        return
+    ruta_rechazados = input("Archivo para guardar las filas rechazadas (Opcional): ").strip() or None
+
+    try:
+        resultado = db.importar_productos(ruta, ruta_rechazados=ruta_rechazados)
+    except (OSError, ValueError) as e:
+        print(Fore.RED + f"❌ No se pudo leer el archivo: {e}" if USE_COLORAMA else f"❌ No se pudo leer el archivo: {e}")
+        return
+
+    if resultado is None:
+        print(Fore.RED + "❌ La importación falló; no se registró ningún producto." if USE_COLORAMA else "❌ La importación falló; no se registró ningún producto.")
+        return
+    print(Fore.GREEN + "✅ Importación finalizada." if USE_COLORAMA else "✅ Importación finalizada.")
+    mostrar_resumen_importacion(resultado)
+
+
+COLUMNAS_DIAGNOSTICO = (
+    tabla.Columna('operacion', 'OPERACIÓN', 30),
+    tabla.Columna('llamadas', 'LLAMADAS', 10, '>', 'd'),
+    tabla.Columna('errores', 'ERRORES', 8, '>', 'd'),
+    tabla.Columna('filas', 'FILAS', 12, '>', 'd'),
+    tabla.Columna('promedio_ms', 'PROM. ms', 10, '>', '.3f'),
+    tabla.Columna('max_ms', 'MÁX. ms', 10, '>', '.3f'),
+)
+
+def mostrar_reporte_diagnostico(reporte):
+    """Imprime las métricas de instrumentación: operaciones, commits, caché y consultas lentas."""
+    print(f"Métricas desde {reporte['desde']} (umbral de consulta lenta: {reporte['umbral_lento_ms']} ms)")
+    operaciones = [
+        dict(m, operacion=nombre)
+        for nombre, m in sorted(reporte['operaciones'].items(), key=lambda item: -item[1]['total_ms'])
+    ]
+    if not tabla.imprimir_tabla(operaciones, COLUMNAS_DIAGNOSTICO, color=color_tabla()):
+        print("Todavía no se registraron operaciones.")
+
+    commits = reporte['commits']
+    print(f"\nCommits: {commits['cantidad']} (total {commits['total_ms']:.1f} ms, máx. {commits['max_ms']:.1f} ms)")
+    cache = reporte['cache']
+    if cache:
+        print(f"Caché: {cache['entradas']}/{cache['capacidad']} entradas, {cache['aciertos']} aciertos, "
+              f"{cache['fallos']} fallos ({cache['tasa_aciertos']:.0%}), {cache['expulsiones']} expulsiones")
+    coordinador = reporte['coordinador']
+    if coordinador:
+        print(f"Coordinador de escritura: {coordinador['operaciones']} operaciones en {coordinador['grupos']} grupos "
+              f"({coordinador['operaciones_por_grupo']:.1f} por commit), {coordinador['esperas_cola_llena']} esperas por cola llena")
+
+    lentas = reporte['consultas_lentas'][-5:]
+    if lentas:
+        print("\nÚltimas consultas lentas:")
+        for entrada in lentas:
+            print(f"  {entrada['fecha']}  {entrada['operacion']}  {entrada['duracion_ms']:.1f} ms")
+            for sentencia in entrada['sentencias'][:3]:
+                print(f"      {sentencia['sql'][:100]}")
+
+def menu_diagnosticos():
+    """Activa, muestra y exporta las métricas de rendimiento de la base de datos."""
+    print(Fore.YELLOW + "\n--- Diagnósticos de Rendimiento ---" if USE_COLORAMA else "\n--- Diagnósticos de Rendimiento ---")
+    reporte = db.reporte_instrumentacion()
+    if reporte is None:
+        print("La instrumentación está desactivada.")
+        if input("¿Desea activarla? (s/N): ").strip().lower() != 's':
+            return
+        try:
+            umbral = float(input("Umbral de consulta lenta en ms [100]: ").strip() or 100)
+        except ValueError:
+            print(Fore.RED + "El umbral debe ser un número. Operación cancelada." if USE_COLORAMA else "El umbral debe ser un número. Operación cancelada.")
+            return
+        ruta_log = input("Archivo JSONL para el registro de consultas lentas (Opcional): ").strip() or None
+        db.activar_instrumentacion(umbral, ruta_log)
+        print(Fore.GREEN + "✅ Instrumentación activada." if USE_COLORAMA else "✅ Instrumentación activada.")
+        return
+
+    mostrar_reporte_diagnostico(reporte)
+    accion = input("\n[E]xportar a JSON, [R]einiciar métricas, [D]esactivar, ENTER para volver: ").strip().lower()
+    if accion == 'e':
+        ruta = input("Archivo de destino [diagnostico.json]: ").strip() or 'diagnostico.json'
+        try:
+            db.exportar_instrumentacion(ruta)
+            print(Fore.GREEN + f"✅ Métricas exportadas a {ruta}." if USE_COLORAMA else f"✅ Métricas exportadas a {ruta}.")
+        except OSError as e:
+            print(Fore.RED + f"❌ No se pudo exportar: {e}" if USE_COLORAMA else f"❌ No se pudo exportar: {e}")
+    elif accion == 'r':
+        db.activar_instrumentacion(reporte['umbral_lento_ms'], reporte['ruta_log_lentas'])
+    elif accion == 'd':
+        db.desactivar_instrumentacion()
+
+
+def menu_movimiento_stock():
+    """Registra una entrada o salida de stock sin reescribir el resto del producto."""
+    print(Fore.YELLOW + "\n--- Movimiento de Stock ---" if USE_COLORAMA else "\n--- Movimiento de Stock ---")
+    try:
+        id_producto = int(input("Ingrese el ID del producto: "))
+        delta = int(input("Cantidad (positiva = entrada, negativa = salida): "))
+        if delta == 0: raise ValueError
+    except ValueError:
+        print(Fore.RED + "El ID y la cantidad deben ser números enteros (cantidad distinta de 0)." if USE_COLORAMA else "El ID y la cantidad deben ser números enteros (cantidad distinta de 0).")
+        return
+    motivo = input("Motivo (Opcional): ").strip() or None
+    referencia = input("Referencia / comprobante (Opcional): ").strip() or None
+
+    cantidad = db.registrar_movimiento(id_producto, delta, motivo, referencia)
+    if cantidad is None:
+        print(Fore.RED + "❌ El movimiento no se registró." if USE_COLORAMA else "❌ El movimiento no se registró.")
+        return
+    print(Fore.GREEN + f"✅ Movimiento registrado. Stock actual del producto {id_producto}: {cantidad}." if USE_COLORAMA else f"✅ Movimiento registrado. Stock actual del producto {id_producto}: {cantidad}.")
+
+    movimientos = db.historial_movimientos(id_producto, limite=5)
+    print("\nÚltimos movimientos:")
+    for m in movimientos:
+        print(f"  {m['fecha']}  {m['delta']:+d} -> {m['cantidad_resultante']}  {m['motivo'] or ''} {m['referencia'] or ''}")
+
+
+COLUMNAS_CATEGORIAS = (
+    tabla.Columna('categoria', 'CATEGORÍA', 30),
+    tabla.Columna('productos', 'PRODUCTOS', 12, '>', ','),
+    tabla.Columna('unidades', 'UNIDADES', 14, '>', ','),
+    tabla.Columna('valor_total', 'VALOR TOTAL', 20, '>', ',.2f'),
+    tabla.Columna('bajo_stock', 'STOCK BAJO', 12, '>', ','),
+)
+
+def menu_resumen_categorias():
+    """Muestra unidades, valor y stock bajo por categoría desde los agregados precalculados."""
+    print(Fore.YELLOW + "\n--- Resumen por Categoría ---" if USE_COLORAMA else "\n--- Resumen por Categoría ---")
+    filas = db.reporte_categorias()
+    if not filas:
+        print(Fore.YELLOW + "\n[!] No hay productos registrados." if USE_COLORAMA else "\n[!] No hay productos registrados.")
+        return
+
+    filas = [dict(f, categoria=f['categoria'] or '(sin categoría)') for f in filas]
+    total = {
+        'categoria': 'TOTAL',
+        'productos': sum(f['productos'] for f in filas),
+        'unidades': sum(f['unidades'] for f in filas),
+        'valor_total': sum(f['valor_total'] for f in filas),
+        'bajo_stock': sum(f['bajo_stock'] for f in filas),
+    }
+    tabla.imprimir_tabla(filas, COLUMNAS_CATEGORIAS, color=color_tabla(), pie=total)
+    print("\n(Stock bajo: cantidad igual o inferior al punto de reorden de cada producto)")
+
+def mostrar_progreso_respaldo(copiadas, total):
+    """Muestra el avance de la copia en una sola línea."""
+    print(f"\rCopiando... {copiadas / total if total else 1:.0%} ({copiadas}/{total} páginas)", end='', flush=True)
+
+def mostrar_resultado_respaldo(resultado):
+    """Imprime la ruta, el tamaño y la duración de un respaldo recién creado."""
+    print(f"Archivo:          {resultado['ruta']}")
+    print(f"Tamaño:           {resultado['bytes'] / 1_048_576:,.1f} MiB ({resultado['paginas']} páginas)")
+    print(f"Pasos:            {resultado['pasos']} (reinicios por escrituras concurrentes: {resultado['reinicios']})")
+    print(f"Tiempo:           {resultado['segundos']:.2f} s")
+    if resultado['borrados']:
+        print(f"Respaldos antiguos borrados: {resultado['borrados']}")
+
+def menu_respaldos():
+    """Crea un respaldo en caliente o restaura uno existente."""
+    print(Fore.YELLOW + "\n--- Respaldos ---" if USE_COLORAMA else "\n--- Respaldos ---")
+    respaldos = db.listar_respaldos()
+    if respaldos:
+        print(f"Respaldos en '{db.DIRECTORIO_RESPALDOS}' (más reciente primero):")
+        for numero, respaldo in enumerate(respaldos, start=1):
+            print(f"  {numero}. {respaldo['fecha']}  {respaldo['bytes'] / 1_048_576:,.1f} MiB")
+    else:
+        print(f"Todavía no hay respaldos en '{db.DIRECTORIO_RESPALDOS}'.")
+    accion = input("\n[C]rear respaldo, [R]estaurar uno, ENTER para volver: ").strip().lower()
+
+    if accion == 'c':
+        resultado = db.crear_respaldo(progreso=mostrar_progreso_respaldo)
+        print()
+        if resultado is None:
+            print(Fore.RED + "❌ No se pudo crear el respaldo." if USE_COLORAMA else "❌ No se pudo crear el respaldo.")
+            return
+        print(Fore.GREEN + "✅ Respaldo creado y verificado." if USE_COLORAMA else "✅ Respaldo creado y verificado.")
+        mostrar_resultado_respaldo(resultado)
+    elif accion == 'r':
+        try:
+            numero = int(input("Número del respaldo a restaurar: "))
+        except ValueError:
+            numero = 0
+        # Un índice 0 o negativo elegiría otro respaldo contando desde el final
+        if not 1 <= numero <= len(respaldos):
+            print(Fore.RED + "Número de respaldo no válido." if USE_COLORAMA else "Número de respaldo no válido.")
+            return
+        respaldo = respaldos[numero - 1]
+        confirmacion = input(f"Se reemplazará el inventario actual por el del {respaldo['fecha']}. ¿Continuar? (s/N): ")
+        if confirmacion.strip().lower() != 's':
+            print("Operación cancelada.")
+            return
+        resultado = db.restaurar_respaldo(respaldo['ruta'])
+        if resultado is None:
+            print(Fore.RED + "❌ No se restauró el respaldo." if USE_COLORAMA else "❌ No se restauró el respaldo.")
+            return
+        print(Fore.GREEN + f"✅ Inventario restaurado en {resultado['segundos']:.2f} s." if USE_COLORAMA else f"✅ Inventario restaurado en {resultado['segundos']:.2f} s.")
+        print(f"El estado anterior quedó respaldado en {resultado['respaldo_previo']}")
+
 
 # --- Menú Principal y Bucle de Aplicación ---
 
@@ -243,7 +495,12 @@ def mostrar_menu():
         print(Fore.CYAN + "4." + Fore.WHITE + " Eliminar producto (por ID)")
         print(Fore.CYAN + "5." + Fore.WHITE + " Buscar producto")
         print(Fore.CYAN + "6." + Fore.WHITE + " Reporte de productos con stock bajo")
-        print(Fore.RED + "7." + Fore.WHITE + " Salir")
+        print(Fore.CYAN + "7." + Fore.WHITE + " Importar productos desde archivo (CSV/JSONL)")
+        print(Fore.CYAN + "8." + Fore.WHITE + " Diagnósticos de rendimiento")
+        print(Fore.CYAN + "9." + Fore.WHITE + " Registrar movimiento de stock (entrada/salida)")
+        print(Fore.CYAN + "10." + Fore.WHITE + " Resumen por categoría (unidades y valor)")
+        print(Fore.CYAN + "11." + Fore.WHITE + " Respaldos (crear / restaurar)")
+        print(Fore.RED + "12." + Fore.WHITE + " Salir")
         print(Fore.GREEN + "------------------------------------------------" + Style.RESET_ALL)
     else:
         # Versión sin colores
@@ -257,18 +514,27 @@ def mostrar_menu():
         print("4. Eliminar producto (por ID)")
         print("5. Buscar producto")
         print("6. Reporte de productos con stock bajo")
-        print("7. Salir")
+        print("7. Importar productos desde archivo (CSV/JSONL)")
+        print("8. Diagnósticos de rendimiento")
+        print("9. Registrar movimiento de stock (entrada/salida)")
+        print("10. Resumen por categoría (unidades y valor)")
+        print("11. Respaldos (crear / restaurar)")
+        print("12. Salir")
         print("------------------------------------------------")
 
 def main():
     """Bucle principal de la aplicación."""
+    # Inicializa colorama solo en modo interactivo (el modo por lotes no la usa)
+    if USE_COLORAMA:
+        init(autoreset=True)
+
     # Inicializa la base de datos (crea el archivo/tabla si no existen)
     db.setup_database()
 
     while True:
         mostrar_menu()
         
-        opcion = input("Ingrese su opción (1-7): ").strip()
+        opcion = input("Ingrese su opción (1-12): ").strip()
         
         if opcion == '1':
             menu_registrar_producto()
@@ -283,15 +549,112 @@ def main():
         elif opcion == '6':
             menu_reporte_stock()
         elif opcion == '7':
+            menu_importar_productos()
+        elif opcion == '8':
+            menu_diagnosticos()
+        elif opcion == '9':
+            menu_movimiento_stock()
+        elif opcion == '10':
+            menu_resumen_categorias()
+        elif opcion == '11':
+            menu_respaldos()
+        elif opcion == '12':
             print(Fore.YELLOW + "Saliendo de la aplicación. ¡Hasta luego!" if USE_COLORAMA else "Saliendo de la aplicación. ¡Hasta luego!")
+            db.cerrar_conexiones()
             break
         else:
             print(Fore.RED + "Opción no válida. Intente de nuevo." if USE_COLORAMA else "Opción no válida. Intente de nuevo.")
             
         # Esperar la pulsación de una tecla para continuar
-        if opcion != '7':
+        if opcion != '12':
             input("\nPresione ENTER para volver al menú...")
 
 
+def ejecutar_linea_de_comandos(argumentos):
+    """Atiende los subcomandos no interactivos (por ejemplo: python main.py importar catalogo.csv)."""
+    parser = argparse.ArgumentParser(description="Sistema de Gestión de Inventario (Python/SQLite)")
+    subcomandos = parser.add_subparsers(dest='comando')
+
+    importar = subcomandos.add_parser('importar', help="Importa productos desde un archivo CSV o JSONL")
+    importar.add_argument('archivo')
+    importar.add_argument('--formato', choices=['csv', 'jsonl'], help="Por defecto se deduce de la extensión")
+    importar.add_argument('--lote', type=int, default=db.TAMANO_LOTE_IMPORTACION, help="Filas por lote de inserción")
+    importar.add_argument('--rechazados', help="Archivo JSONL donde guardar las filas rechazadas")
+
+    lote_parser = subcomandos.add_parser('lote', help="Ejecuta comandos JSONL sin interfaz (ver lote.py)")
+    lote_parser.add_argument('archivo', nargs='?', default='-', help="Archivo de comandos ('-' = entrada estándar)")
+    lote_parser.add_argument('--grupo', type=int, default=lote.TAMANO_GRUPO, help="Comandos por transacción")
+
+    exportar = subcomandos.add_parser('exportar', help="Exporta productos a CSV, JSONL o formato columnar (ver exportacion.py)")
+    exportacion.agregar_argumentos(exportar)
+
+    respaldo = subcomandos.add_parser('respaldo', help="Crea un respaldo verificado de la base sin detener la aplicación")
+    respaldo.add_argument('--directorio', help=f"Por defecto '{db.DIRECTORIO_RESPALDOS}'")
+    respaldo.add_argument('--retencion', type=int, default=db.RETENCION_RESPALDOS, help="Respaldos que se conservan")
+    respaldo.add_argument('--paginas', type=int, default=db.PAGINAS_POR_PASO, help="Páginas copiadas por paso")
+    respaldo.add_argument('--listar', action='store_true', help="Solo lista los respaldos existentes")
+
+    restaurar = subcomandos.add_parser('restaurar', help="Reemplaza la base por un respaldo verificado")
+    restaurar.add_argument('archivo')
+    restaurar.add_argument('--directorio', help="Dónde respaldar el estado actual")
+    restaurar.add_argument('--sin-respaldo-previo', action='store_true', help="No respalda el estado actual antes de restaurar")
+
+    subcomandos.add_parser('verificar-indices', help="Muestra el plan de las consultas críticas y si usan índices")
+
+    args = parser.parse_args(argumentos)
+    if args.comando is None:
+        main()
+        return 0
+    if args.comando == 'lote':
+        # Sin pantalla ni colores: lote.py gestiona su propia conexión y salida JSON
+        return lote.ejecutar_desde_archivo(args.archivo, args.grupo)
+
+    db.setup_database()
+    try:
+        if args.comando == 'importar':
+            try:
+                resultado = db.importar_productos(args.archivo, args.formato, args.lote, args.rechazados)
+            except (OSError, ValueError) as e:
+                print(f"No se pudo leer el archivo: {e}", file=sys.stderr)
+                return 1
+            if resultado is None:
+                return 1
+            mostrar_resumen_importacion(resultado)
+            return 0 if resultado['rechazados'] == 0 else 2
+        if args.comando == 'exportar':
+            return exportacion.ejecutar(args)
+        if args.comando == 'respaldo':
+            if args.listar:
+                for r in db.listar_respaldos(args.directorio):
+                    print(f"{r['fecha']}  {r['bytes']:>12}  {r['ruta']}")
+                return 0
+            resultado = db.crear_respaldo(args.directorio, args.paginas, retencion=args.retencion,
+                                          progreso=mostrar_progreso_respaldo if sys.stdout.isatty() else None)
+            if sys.stdout.isatty():
+                print()
+            if resultado is None:
+                return 1
+            mostrar_resultado_respaldo(resultado)
+            return 0
+        if args.comando == 'restaurar':
+            resultado = db.restaurar_respaldo(args.archivo, not args.sin_respaldo_previo, args.directorio)
+            if resultado is None:
+                return 1
+            print(f"Restaurado {resultado['ruta']} en {resultado['segundos']:.2f} s")
+            if resultado['respaldo_previo']:
+                print(f"Estado anterior respaldado en {resultado['respaldo_previo']}")
+            return 0
+        if args.comando == 'verificar-indices':
+            resultados = db.verificar_planes_consulta()
+            for resultado in resultados:
+                estado = {True: 'OK', False: 'SIN ÍNDICE', None: 'N/D'}[resultado['usa_indice']]
+                print(f"[{estado}] {resultado['consulta']}")
+                for detalle in resultado['plan']:
+                    print(f"      {detalle}")
+            return 0 if all(r['usa_indice'] is not False for r in resultados) else 1
+    finally:
+        db.cerrar_conexiones()
+
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(ejecutar_linea_de_comandos(sys.argv[1:]))
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+Renderizado de tablas para la interfaz de consola.
+
+Las filas se formatean en bloques y se escriben con una sola llamada a write() por
+bloque, en lugar de un print() por fila. El ancho de cada columna se calcula a partir
+de una muestra de las primeras filas (acotado por el máximo de la columna), los valores
+NULL se muestran vacíos y la entrada puede ser cualquier iterable: las filas se
+consumen a medida que se imprimen, página por página si se pide paginar.
+"""
+import shutil
+import sys
+from collections import namedtuple
+from itertools import chain, islice
+
+# Filas que se miran para calcular el ancho de las columnas
+TAMANO_MUESTRA = 200
+# Filas por cada write() cuando no se pagina
+FILAS_POR_ESCRITURA = 2000
+# Texto para los valores NULL
+VALOR_NULO = ''
+RESET = '\033[0m'
+
+# clave: nombre de la columna en la fila; formato: especificación de format() ('' = str)
+Columna = namedtuple('Columna', 'clave titulo ancho_max alineacion formato', defaults=(30, '<', ''))
+
+# Saltos de línea y tabulaciones romperían la tabla
+_SIN_CONTROL = str.maketrans({'\n': ' ', '\r': ' ', '\t': ' '})
+
+
+def _texto(valor, formato):
+    if valor is None:
+        return VALOR_NULO
+    if not formato:
+        return str(valor)
+    try:
+        return format(valor, formato)
+    except (TypeError, ValueError):
+        # SQLite no impone tipos: un REAL o un TEXT en una columna entera se muestra tal cual
+        return str(valor)
+
+def _calcular_anchos(columnas, muestra):
+    anchos = []
+    for columna in columnas:
+        ancho = max((len(_texto(fila[columna.clave], columna.formato)) for fila in muestra), default=0)
+        anchos.append(max(len(columna.titulo), min(ancho, columna.ancho_max)))
+    return anchos
+
+def _formateador(columnas, anchos):
+    """
+    Retorna una función fila -> línea de texto. Cada línea se arma con una sola llamada
+    a str.format sobre una plantilla precompilada; la precisión de las columnas de texto
+    ('{!s:<30.30}') recorta lo que excede el ancho. Las columnas con formato (números)
+    nunca se recortan: un valor más ancho que la muestra desborda la columna.
+    """
+    claves = [columna.clave for columna in columnas]
+    plantilla = ' | '.join(
+        f"{{:{c.alineacion}{ancho}{c.formato}}}" if c.formato else f"{{!s:{c.alineacion}{ancho}.{ancho}}}"
+        for c, ancho in zip(columnas, anchos)
+    )
+    # Para celdas ya convertidas a texto: se alinean y solo las de texto se recortan
+    plantilla_texto = ' | '.join(
+        f"{{:{c.alineacion}{ancho}}}" if c.formato else f"{{:{c.alineacion}{ancho}.{ancho}}}"
+        for c, ancho in zip(columnas, anchos)
+    )
+
+    def formatear(fila):
+        valores = [fila[clave] for clave in claves]
+        linea = None
+        if None not in valores:
+            try:
+                linea = plantilla.format(*valores)
+            except (TypeError, ValueError):
+                pass
+        if linea is None:
+            # Algún NULL o un valor que no admite el formato de su columna: celda por celda
+            linea = plantilla_texto.format(*[_texto(valor, c.formato) for valor, c in zip(valores, columnas)])
+        # Buscar es mucho más barato que translate(), que casi nunca hace falta
+        if '\n' in linea or '\r' in linea or '\t' in linea:
+            linea = linea.translate(_SIN_CONTROL)
+        return linea
+    return formatear
+
+def tamano_pagina_terminal():
+    """Filas de datos que entran en la terminal dejando lugar para la cabecera y el aviso."""
+    return max(5, shutil.get_terminal_size().lines - 6)
+
+def imprimir_tabla(filas, columnas, salida=None, color='', paginar=False, tamano_pagina=None,
+                   pie=None, entrada=input):
+    """
+    Imprime 'filas' (cualquier iterable de filas indexables por clave, como sqlite3.Row
+    o dict) con las 'columnas' indicadas. 'color' es un prefijo ANSI opcional para la
+    cabecera y los separadores; 'pie' es una fila opcional que se muestra al final
+    (por ejemplo, totales). Con 'paginar', se detiene cada 'tamano_pagina' filas (por
+    defecto, lo que entra en la terminal) y pregunta si continuar; las filas siguientes
+    no se leen hasta que se piden.
+    Retorna la cantidad de filas impresas (0 si no había filas: no imprime nada).
+    """
+    salida = salida or sys.stdout
+    if paginar:
+        tamano_pagina = tamano_pagina or tamano_pagina_terminal()
+    else:
+        tamano_pagina = FILAS_POR_ESCRITURA
+    filas = iter(filas)
+    # Al paginar, la muestra no pasa de la primera página: el resto se lee cuando se pide
+    muestra = list(islice(filas, min(TAMANO_MUESTRA, tamano_pagina) if paginar else TAMANO_MUESTRA))
+    if not muestra:
+        return 0
+
+    anchos = _calcular_anchos(columnas, muestra + ([pie] if pie is not None else []))
+    formatear = _formateador(columnas, anchos)
+    pintar = (lambda texto: f"{color}{texto}{RESET}") if color else (lambda texto: texto)
+    cabecera = ' | '.join(format(c.titulo, f"{c.alineacion}{a}") for c, a in zip(columnas, anchos))
+    separador = pintar('-' * len(cabecera))
+    titulo = [separador, pintar(cabecera), separador]
+    cierre = [separador] + ([formatear(pie), separador] if pie is not None else []) + ['']
+
+    filas = chain(muestra, filas)
+    pagina = list(islice(filas, tamano_pagina))
+    impresas = 0
+    lineas = [''] + titulo
+    while True:
+        lineas.extend(map(formatear, pagina))
+        impresas += len(pagina)
+        # Se mira una sola fila más para saber si queda otra página
+        siguiente = next(filas, None)
+        if siguiente is None:
+            salida.write('\n'.join(lineas + cierre) + '\n')
+            return impresas
+        salida.write('\n'.join(lineas) + '\n')
+        lineas = []
+        if paginar:
+            salida.flush()
+            respuesta = entrada(f"-- {impresas} filas mostradas -- ENTER: siguiente página, Q: terminar ")
+            if respuesta.strip().lower() == 'q':
+                salida.write('\n'.join(cierre) + '\n')
+                return impresas
+            # Cada página repite la cabecera
+            lineas = list(titulo)
+        pagina = [siguiente] + list(islice(filas, tamano_pagina - 1))